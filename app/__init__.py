@@ -4,10 +4,12 @@ from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail  # 添加邮件扩展
 from flask_migrate import Migrate
+from sqlalchemy import text
 from config import config
+from app.db_routing import RoutingSession
 
 # 初始化扩展
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # 支持只读副本路由
 login_manager = LoginManager()
 csrf = CSRFProtect()
 mail = Mail()  # 添加邮件对象
@@ -24,16 +26,67 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # 允许个别视图（商品批量导入）接收更大的上传
+    from app.uploads import UploadRequest
+    app.request_class = UploadRequest
+    
     # 初始化配置
     config[config_name].init_app(app)
     
     # 初始化扩展
+    from app import db_pool
+    db_pool.configure_pool(app)  # 需在创建数据库引擎之前
     db.init_app(app)
+    db_pool.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
     mail.init_app(app)  # 初始化邮件
     migrate.init_app(app, db)
     
+    # 初始化分类缓存
+    from app.category_cache import category_cache
+    category_cache.init_app(app)
+    
+    # 初始化请求级 SQL 统计（最先注册，使其 before_request 最先执行）
+    from app.profiling import profiler
+    profiler.init_app(app)
+    
+    # 初始化只读副本路由
+    from app.db_routing import replica_router
+    replica_router.init_app(app)
+    
+    # 初始化邮件发送队列
+    from app.mail_queue import mail_queue
+    mail_queue.init_app(app)
+    
+    # 初始化密码哈希服务（需在创建默认用户之前）
+    from app.passwords import password_hasher
+    password_hasher.init_app(app)
+    
+    # 初始化登录用户身份缓存
+    from app.user_cache import user_cache
+    user_cache.init_app(app)
+    
+    # 初始化匿名页面缓存
+    from app.page_cache import page_cache
+    page_cache.init_app(app)
+    
+    # 初始化用户日志异步写入
+    from app.user_log import user_log_writer
+    user_log_writer.init_app(app)
+    
+    # 初始化订单号生成器
+    from app.snowflake import order_number_generator
+    order_number_generator.init_app(app)
+    
+    # 初始化商品图片处理（模板中的 product_image_url）
+    from app.images import image_processor
+    image_processor.init_app(app)
+    
+    # 初始化静态资源清单（模板中的 static_url）
+    from app.assets import asset_manifest
+    asset_manifest.init_app(app)
+    
     # 注册蓝图
     from app.auth import auth as auth_blueprint
     from app.main import main as main_blueprint
@@ -53,6 +106,10 @@ def create_app(config_name='default'):
     from app.errors import register_error_handlers
     register_error_handlers(app)
     
+    # 注册命令行命令
+    from app.commands import register_commands
+    register_commands(app)
+    
     # 注册上下文处理器
     from app.context_processors import inject_now, inject_categories, inject_cart_info
     app.context_processor(inject_now)
@@ -72,11 +129,15 @@ def create_app(config_name='default'):
         # 确保数据库连接正常
         with app.app_context():
             try:
-                db.session.execute('SELECT 1')
+                db.session.execute(text('SELECT 1'))
                 print("数据库连接正常")
             except Exception as e:
                 print(f"数据库连接失败: {e}")
     
+    # 初始化商品搜索索引
+    from app.search import init_search
+    init_search(app)
+    
     return app
 
 def create_default_data():
@@ -1,10 +1,22 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, abort
+from flask import (render_template, redirect, url_for, flash, request, jsonify, abort, Response,
+                   current_app, stream_with_context)
+from datetime import datetime
 from flask_login import current_user, login_required
 from app import db
-from app.models import Product, Category, Order, User, UserLog
+from app.models import Product, Order, User, InventoryHold
 from app.forms import ProductForm, CategoryForm
-from sqlalchemy import or_
 from app.admin import admin
+from app.category_cache import get_categories
+from app.pagination import keyset_paginate, approximate_count
+from app.search import search_products
+from app.db_routing import read_only
+from app.fastjson import dumps
+from app.uploads import max_upload_size
+from app.user_log_buckets import approximate_total, paginate_logs
+from app.sales_rollup import (remove_order, status_summary, daily_trend,
+                              category_breakdown, parse_date_range, REVENUE_STATUSES)
+from app.inventory import cancel_and_restock
+from app.page_cache import invalidate_products
 
 def admin_required(f):
     """管理员权限装饰器"""
@@ -26,13 +38,22 @@ def check_admin():
 
 @admin.route('/dashboard')
 @admin_required
+@read_only()
 def dashboard():
     """管理员仪表板"""
-    # 基础统计
-    total_orders = Order.query.filter_by(status='pending').count()
-    total_users = User.query.count()
-    total_products = Product.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter_by(status='pending').scalar() or 0
+    # 订单统计读取预聚合的销售汇总，不扫描订单表
+    summary = status_summary()
+    total_orders = sum(summary.get(status, (0, 0))[0] for status in REVENUE_STATUSES)
+    total_revenue = sum(summary.get(status, (0, 0))[1] for status in REVENUE_STATUSES)
+    total_users = approximate_count(User)
+    total_products = approximate_count(Product)
+    
+    # 日期范围内的趋势和分类排行
+    start, end = parse_date_range(request.args.get('start'), request.args.get('end'))
+    trend = daily_trend(start, end)
+    category_names = {category.id: category.name for category in get_categories()}
+    categories = [(category_names.get(category_id, f'分类 {category_id}'), order_count, quantity, revenue)
+                  for category_id, order_count, quantity, revenue in category_breakdown(start, end)]
     
     # 最近订单
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
@@ -42,29 +63,36 @@ def dashboard():
                          total_users=total_users,
                          total_products=total_products,
                          total_revenue=total_revenue,
+                         summary=summary,
+                         start=start,
+                         end=end,
+                         trend=trend,
+                         categories=categories,
                          recent_orders=recent_orders)
 
 @admin.route('/products')
 @admin_required
+@read_only()
 def product_manage():
     """商品管理"""
     page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category_id', type=int)
     keyword = request.args.get('q', '').strip()
     
-    query = Product.query
-    
     if keyword:
-        query = query.filter(or_(Product.name.contains(keyword), Product.description.contains(keyword)))
-    
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    query = query.order_by(Product.created_at.desc())
-    
-    products = query.paginate(page=page, per_page=20, error_out=False)
+        # 有关键词时使用全文搜索，按相关度排序
+        products = search_products(keyword, category_id=category_id, page=page, per_page=20)
+    else:
+        query = Product.query
+        
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+        
+        query = query.order_by(Product.created_at.desc())
+        
+        products = query.paginate(page=page, per_page=20, error_out=False)
     
-    categories = Category.query.all()
+    categories = get_categories()
     
     return render_template('product_manage.html',
                          products=products,
@@ -73,13 +101,23 @@ def product_manage():
                          keyword=keyword)
 
 
+def _save_product_image(form):
+    """表单校验通过后生成上传图片的各规格文件，返回图片键；处理失败时记录到表单错误并返回 None"""
+    from app.images import image_processor
+    try:
+        return image_processor.save_upload(form.image_file.data)
+    except ValueError as e:
+        form.image_file.errors.append(str(e))
+        return None
+
+
 @admin.route('/products/add', methods=['GET', 'POST'])
 @admin_required
 def add_product():
     """添加商品"""
     form = ProductForm()
     # 动态加载分类选项
-    form.category_id.choices = [(category.id, category.name) for category in Category.query.order_by(Category.name)]
+    form.category_id.choices = [(category.id, category.name) for category in get_categories()]
     
     if form.validate_on_submit():
         # 创建新商品
@@ -90,6 +128,11 @@ def add_product():
             stock=form.stock.data,
             category_id=form.category_id.data
         )
+        if form.image_file.data:
+            image_key = _save_product_image(form)
+            if image_key is None:
+                return render_template('add_product.html', form=form)
+            product.image = image_key
         db.session.add(product)
         db.session.commit()
         
@@ -108,7 +151,7 @@ def edit_product(id):
     
     form = ProductForm(obj=product)  # 使用现有商品数据初始化表单
     # 动态加载分类选项
-    form.category_id.choices = [(category.id, category.name) for category in Category.query.order_by(Category.name)]
+    form.category_id.choices = [(category.id, category.name) for category in get_categories()]
     
     if form.validate_on_submit():
         # 更新商品信息
@@ -117,6 +160,12 @@ def edit_product(id):
         product.price = form.price.data
         product.stock = form.stock.data
         product.category_id = form.category_id.data
+        if form.image_file.data:
+            image_key = _save_product_image(form)
+            if image_key is None:
+                db.session.rollback()
+                return render_template('edit_product.html', form=form, product=product)
+            product.image = image_key
         
         db.session.commit()
         
@@ -133,18 +182,76 @@ def delete_product(id):
     # 获取要删除的商品
     product = Product.query.get_or_404(id)
     
-    # 删除商品
+    # 删除商品及其库存锁定
+    InventoryHold.query.filter_by(product_id=product.id).delete()
     db.session.delete(product)
     db.session.commit()
     
     # 重定向到商品管理页面
     return redirect(url_for('admin.product_manage'))
 
+@admin.route('/products/export')
+@admin_required
+def export_products():
+    """流式导出商品（CSV / JSONL），内存占用与商品数无关"""
+    from app.exports import FORMATS, stream_export
+    from app.product_io import EXPORT_COLUMNS, export_rows
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400)
+    category_id = request.args.get('category_id', type=int)
+
+    def rows():
+        with read_only():
+            yield from export_rows(category_id)
+
+    return stream_export(rows, EXPORT_COLUMNS, fmt, 'products', compress=request.args.get('gzip') == '1')
+
+
+@admin.route('/products/import', methods=['GET', 'POST'])
+@max_upload_size('PRODUCT_IMPORT_MAX_SIZE')
+@admin_required
+def import_products():
+    """批量导入商品：逐行校验，分批提交，以 NDJSON 流式返回进度"""
+    from app.product_io import import_products as run_import, read_upload
+
+    if request.method == 'GET':
+        return render_template('product_import.html', categories=get_categories())
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': '请选择要导入的文件'}), 400
+    try:
+        rows, first_line = read_upload(upload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    chunk_size = current_app.config.get('PRODUCT_IMPORT_CHUNK_SIZE', 1000)
+    admin_id = current_user.id
+
+    def generate():
+        error = None
+        try:
+            for result in run_import(rows, chunk_size=chunk_size, first_line=first_line):
+                yield dumps({'rows': result.rows, 'inserted': result.inserted,
+                             'updated': result.updated, 'error_count': result.error_count}) + b'\n'
+        except (ValueError, UnicodeDecodeError) as e:
+            # 文件格式错误（如 JSON 无法解析）：之前已提交的批次保留
+            db.session.rollback()
+            error = f'导入中止：{e}'
+        current_app.logger.info(f'管理员 {admin_id} 导入商品：{result.as_dict()}')
+        yield dumps(dict(result.as_dict(), done=True, error=error)) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
 @admin.route('/orders')
 @admin_required
+@read_only()
 def order_manage():
     """订单管理"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     status = request.args.get('status', '')
     
     query = Order.query
@@ -152,14 +259,45 @@ def order_manage():
     if status:
         query = query.filter_by(status=status)
     
-    orders = query.order_by(Order.created_at.desc())\
-        .paginate(page=page, per_page=20, error_out=False)
+    # 游标分页；未筛选时显示估算总数，避免对订单表执行 COUNT(*)
+    orders = keyset_paginate(query, [(Order.created_at, True), (Order.id, True)],
+                             cursor=cursor, per_page=20,
+                             total=None if status else approximate_count(Order))
     
     return render_template('order_manage.html', orders=orders, status=status)
 
 
+@admin.route('/orders/export')
+@admin_required
+def export_orders():
+    """流式导出订单明细（CSV / JSONL，可 gzip 压缩），可按状态和日期（UTC）筛选"""
+    from datetime import timedelta
+    from app.exports import FORMATS, stream_export
+    from app.order_export import EXPORT_COLUMNS, export_rows
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400)
+    status = request.args.get('status') or None
+    try:
+        start = request.args.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end = request.args.get('end')
+        # 结束日期包含当天
+        end = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    except ValueError:
+        abort(400)
+
+    def rows():
+        with read_only():
+            yield from export_rows(status, start, end)
+
+    return stream_export(rows, EXPORT_COLUMNS, fmt, 'orders', compress=request.args.get('gzip') == '1')
+
+
 @admin.route('/orders/<int:id>')
 @admin_required
+@read_only()
 def order_detail(id):
     """订单详情"""
     order = Order.query.get_or_404(id)
@@ -184,23 +322,16 @@ def cancel_order(id):
         order = Order.query.get_or_404(id)
         logger.debug(f"找到订单: ID={order.id}, 状态={order.status}")
         
-        # 只有pending或paid状态的订单才能取消
-        if order.status not in ['pending', 'paid']:
+        # 只有pending或paid状态的订单才能取消（按状态条件更新，并发的取消只有一个生效）
+        category_ids = cancel_and_restock(order, ('pending', 'paid'))
+        if category_ids is None:
+            db.session.rollback()
             flash('该订单状态不允许取消', 'danger')
             logger.debug(f"订单状态不允许取消: {order.status}")
             return redirect(url_for('admin.order_manage'))
         
-        # 恢复库存
-        for item in order.items:
-            product = Product.query.get(item.product_id)
-            if product:
-                product.stock += item.quantity
-                logger.debug(f"恢复商品库存: 商品ID={item.product_id}, 数量={item.quantity}, 恢复后库存={product.stock}")
-        
-        # 更新订单状态为取消
-        order.status = 'cancelled'
-        logger.debug(f"更新订单状态为: cancelled")
         db.session.commit()
+        invalidate_products(category_ids)
         logger.debug(f"订单状态更新成功")
         
         flash('订单已成功取消', 'success')
@@ -233,7 +364,8 @@ def delete_order(id):
             logger.debug(f"订单状态不允许删除: {order.status}")
             return redirect(url_for('admin.order_manage'))
         
-        # 删除订单
+        # 删除订单（先从销售汇总中扣除）
+        remove_order(order)
         db.session.delete(order)
         logger.debug(f"删除订单ID: {order.id}")
         db.session.commit()
@@ -247,40 +379,71 @@ def delete_order(id):
         flash(f'删除订单失败: {str(e)}', 'danger')
         return redirect(url_for('admin.order_manage'))
 
+@admin.route('/pool-stats')
+@admin_required
+def pool_stats():
+    """处理本请求的 worker 的数据库连接池状态"""
+    from app.db_pool import pool_stats
+    return jsonify(pool_stats())
+
+
+@admin.route('/perf')
+@admin_required
+def perf():
+    """各端点的 SQL 统计（本 worker）"""
+    import os
+    from app.profiling import profiler
+    return render_template('perf.html',
+                         endpoints=profiler.report(),
+                         since=datetime.fromtimestamp(profiler.since),
+                         threshold=profiler.n_plus_one_threshold,
+                         pid=os.getpid())
+
+
+@admin.route('/perf/reset', methods=['POST'])
+@admin_required
+def perf_reset():
+    """清空本 worker 的 SQL 统计"""
+    from app.profiling import profiler
+    profiler.reset()
+    flash('统计已清空', 'success')
+    return redirect(url_for('admin.perf'))
+
+
 @admin.route('/users')
 @admin_required
+@read_only()
 def user_manage():
     """用户管理"""
-    page = request.args.get('page', 1, type=int)
-    users = User.query.order_by(User.created_at.desc())\
-        .paginate(page=page, per_page=20, error_out=False)
+    cursor = request.args.get('cursor')
+    users = keyset_paginate(User.query, [(User.created_at, True), (User.id, True)],
+                            cursor=cursor, per_page=20, total=approximate_count(User))
     
     return render_template('user_manage.html', users=users)
 
 
 @admin.route('/users/<int:id>')
 @admin_required
+@read_only()
 def user_detail(id):
     """用户详情"""
     user = User.query.get_or_404(id)
     # 获取排序后的订单和日志
     orders = user.orders.order_by(Order.created_at.desc()).limit(10).all()
-    logs = user.logs.order_by(UserLog.created_at.desc()).limit(10).all()
+    # 热表和月表中最近的 10 条日志，找到后不再访问更早的月表
+    logs = paginate_logs(user_id=user.id, per_page=10)
     return render_template('user_detail.html', user=user, orders=orders, logs=logs)
 
 @admin.route('/logs')
 @admin_required
+@read_only()
 def user_logs():
     """用户日志"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     user_id = request.args.get('user_id', type=int)
     
-    query = UserLog.query
-    
-    if user_id:
-        query = query.filter_by(user_id=user_id)
-    
-    logs = query.order_by(UserLog.created_at.desc())\
-        .paginate(page=page, per_page=50, error_out=False)
+    # 游标分页：日志按月分表，只查询与当前页相关的表；任意深的页开销都与第一页相同
+    logs = paginate_logs(user_id=user_id, cursor=cursor, per_page=50,
+                         total=None if user_id else approximate_total())
     
-    return render_template('user_logs.html', logs=logs)
+    return render_template('user_logs.html', logs=logs, user_id=user_id)
@@ -0,0 +1,188 @@
+"""静态资源构建与带哈希的资源地址
+
+flask build-assets 把 app/static 下的文件（上传目录除外）复制到 app/static/dist，
+文件名加入内容哈希（css/style.css -> css/style.<哈希>.css），CSS、JS、SVG 另外生成
+gzip（.gz）和 brotli（.br）预压缩文件，最后写入 manifest.json（原路径 -> 带哈希的路径）。
+
+模板用 static_url('css/style.css') 引用静态文件：清单中有该文件时返回带哈希的地址，
+nginx 对 /static/dist/ 设置永久缓存并直接发送预压缩文件；没有构建过时退回原文件地址。
+内容变化后文件名随之变化，浏览器不会用到旧缓存。
+
+CSS 中相对路径的 url() 会改写为带哈希的文件名。上一次构建的文件会保留，
+页面缓存中引用旧地址的页面在过期前仍能正常加载。
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import time
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只生成 .gz
+    brotli = None
+
+OUTPUT_DIR = 'dist'
+MANIFEST = 'manifest.json'
+EXCLUDE_DIRS = {OUTPUT_DIR, 'uploads'}
+COMPRESS_EXTENSIONS = {'.css', '.js', '.svg'}  # 与 nginx.conf 中发送 .br 文件的 location 一致
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def hashed_name(path, data):
+    """css/style.css -> css/style.<内容哈希前 12 位>.css"""
+    root, ext = posixpath.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _rewrite_css(path, text, manifest):
+    """把 CSS 中指向已构建文件的相对 url() 改为带哈希的文件名"""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', ref).groups()  # 保留 ?查询 和 #片段
+        target = posixpath.normpath(posixpath.join(directory, target))
+        if target not in manifest:
+            return match.group(0)
+        # dist 下的目录结构与原目录相同，相对路径按原 CSS 所在目录计算
+        return f'url("{posixpath.relpath(manifest[target], directory)}{suffix}")'
+
+    return CSS_URL.sub(replace, text)
+
+
+def _sources(static_folder):
+    """static 目录下需要构建的文件（相对路径，以 / 分隔），CSS 排在最后以便改写其中的引用"""
+    paths = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if not name.startswith('.'):
+                paths.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    return sorted(paths, key=lambda path: (path.endswith('.css'), path))
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build_assets(static_folder, progress=None):
+    """构建 static_folder 下的静态资源，返回统计信息
+
+    带哈希的文件已存在时跳过（内容相同），只补生成缺少的压缩文件；清单最后写入，
+    运行中的 worker 读到新清单时引用的文件都已就绪。
+    """
+    output_dir = os.path.join(static_folder, OUTPUT_DIR)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = _read_manifest(manifest_path)
+    manifest = {}
+    stats = {'files': 0, 'written': 0, 'compressed': 0, 'removed': 0, 'brotli': brotli is not None}
+
+    for path in _sources(static_folder):
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(path, data.decode('utf-8'), manifest).encode('utf-8')
+        name = hashed_name(path, data)
+        manifest[path] = name
+        stats['files'] += 1
+
+        target = os.path.join(output_dir, name)
+        if not os.path.exists(target):
+            _write(target, data)
+            stats['written'] += 1
+        if posixpath.splitext(path)[1] in COMPRESS_EXTENSIONS:
+            compressors = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.append(('.br', lambda d: brotli.compress(d, mode=brotli.MODE_TEXT, quality=11)))
+            for suffix, compress in compressors:
+                if os.path.exists(target + suffix):
+                    continue
+                compressed = compress(data)
+                # 压缩后没有变小的不生成，nginx 直接发送原文件
+                if len(compressed) < len(data):
+                    _write(target + suffix, compressed)
+                    stats['compressed'] += 1
+        if progress:
+            progress(path, name)
+
+    # 清理不属于本次和上一次构建的文件
+    keep = set(manifest.values()) | set(previous.values())
+    for root, _, files in os.walk(output_dir):
+        for filename in files:
+            full = os.path.join(root, filename)
+            name = os.path.relpath(full, output_dir).replace(os.sep, '/')
+            if name == MANIFEST:
+                continue
+            base = name[:-3] if name.endswith(('.gz', '.br')) else name
+            if base not in keep:
+                os.remove(full)
+                stats['removed'] += 1
+
+    _write(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'))
+    return stats
+
+
+class AssetManifest:
+    """读取构建清单；清单文件变化后（重新构建）自动重新加载，每秒最多检查一次"""
+
+    def __init__(self):
+        self.path = None
+        self.manifest = {}
+        self.mtime = None
+        self.checked_at = 0
+
+    def init_app(self, app):
+        self.path = os.path.join(app.static_folder, OUTPUT_DIR, MANIFEST)
+        self.manifest = {}
+        self.mtime = None
+        self.checked_at = 0
+        app.jinja_env.globals['static_url'] = static_url
+        app.extensions['assets'] = self
+
+    def lookup(self, filename):
+        now = time.monotonic()
+        if now - self.checked_at >= 1:
+            self.checked_at = now
+            self._reload()
+        return self.manifest.get(filename)
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except (FileNotFoundError, TypeError):
+            self.manifest, self.mtime = {}, None
+            return
+        if mtime != self.mtime:
+            self.manifest, self.mtime = _read_manifest(self.path), mtime
+
+
+asset_manifest = AssetManifest()
+
+
+def static_url(filename):
+    """静态文件地址：构建过时返回带哈希的 /static/dist/ 地址，否则返回原文件地址"""
+    name = asset_manifest.lookup(filename)
+    if name is None:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=f'{OUTPUT_DIR}/{name}')
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, current_user, login_required
 from app import db
 from app.models import User, UserLog
 from app.auth import auth
+from app.passwords import PasswordHasherBusy
 from datetime import datetime
 
 @auth.route('/login', methods=['GET', 'POST'])
@@ -17,7 +18,13 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            password_ok = user is not None and user.check_password(password)
+        except PasswordHasherBusy:
+            flash('登录人数过多，请稍后再试', 'warning')
+            return render_template('login.html'), 503
+        
+        if password_ok:
             if not user.is_active:
                 flash('账户已被禁用，请联系管理员', 'danger')
                 return redirect(url_for('auth.login'))
@@ -26,6 +33,13 @@ def login():
             
             # 更新最后登录时间
             user.last_login = datetime.utcnow()
+            
+            # 哈希参数已调整时，用本次输入的密码按新参数重新计算
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                except PasswordHasherBusy:
+                    pass  # 下次登录时再更新
             db.session.commit()
             
             flash(f'登录成功！欢迎回来，{user.username}！', 'success')
@@ -75,7 +89,11 @@ def register():
         
         # 创建新用户
         new_user = User(username=username, email=email)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except PasswordHasherBusy:
+            flash('注册人数过多，请稍后再试', 'warning')
+            return render_template('register.html'), 503
         
         try:
             db.session.add(new_user)
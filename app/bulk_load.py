@@ -0,0 +1,442 @@
+"""批量导入与合成数据生成
+
+数据以行字典的形式流式读取（生成器、CSV 或 JSONL 文件，支持 .gz），按块使用 Core
+executemany 写入，每写满 transaction_rows 行提交一次，内存占用与数据总量无关。
+
+加速措施：
+- 目标表为空时先删除非唯一索引，写完后一次性重建（唯一索引保留，用于校验数据）；
+- 只使用一个专用连接，SQLite 写入期间关闭 synchronous，MySQL 写入生成数据时关闭
+  唯一性和外键检查（导入外部文件时保留检查）；结束后恢复原设置。
+
+直接写入绕过了 ORM 事件，导入后需调用 refresh_derived_data 重建销量、销售汇总、
+搜索索引并失效页面缓存（seed_catalog 和 import_file 已自动调用）。
+"""
+import csv
+import gzip
+import io
+import json
+import random
+import time
+from array import array
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app import db
+from app.models import Category, Order, OrderItem, Product, User
+
+CHUNK_SIZE = 5000
+TRANSACTION_ROWS = 50000
+
+# 可导入的表
+IMPORT_TABLES = {
+    'categories': Category,
+    'products': Product,
+    'users': User,
+    'orders': Order,
+    'order_items': OrderItem,
+}
+
+DEFAULT_CATEGORIES = [
+    ('电子产品', '手机、电脑、平板等数码产品'),
+    ('服装鞋帽', '男女服装、鞋子、配饰等'),
+    ('图书音像', '书籍、音乐、电影等'),
+    ('家居用品', '家具、厨具、装饰品等'),
+    ('食品饮料', '零食、饮料、生鲜等'),
+    ('美妆个护', '化妆品、护肤品、个人护理等'),
+    ('运动户外', '运动器材、户外装备等'),
+    ('母婴玩具', '母婴用品、儿童玩具等'),
+]
+
+# 商品名由品牌、修饰词和品类组合而成
+BRANDS = ['华为', '小米', '联想', '耐克', '李宁', '海尔', '美的', '格力', '安踏', '戴森',
+          'Apple', 'Sony', 'Canon', 'Lenovo', 'Dell', 'Nike', 'Adidas', 'Philips']
+ADJECTIVES = ['新款', '经典', '轻薄', '旗舰', '便携', '专业', '智能', '限量', '复古', '高端']
+NOUNS = ['手机', '笔记本', '耳机', '跑鞋', '外套', '台灯', '吸尘器', '咖啡豆', '积木', '背包',
+         '手表', '相机', '键盘', '面霜', '帐篷', '保温杯', '显示器', '音箱', '电饭煲', '瑜伽垫']
+ORDER_STATUSES = ['pending', 'paid', 'shipped', 'delivered', 'cancelled']
+
+
+class BulkLoader:
+    """按块写入多个表；同一块中先写入先出现的表（如先订单后订单项）"""
+
+    def __init__(self, connection, chunk_size=CHUNK_SIZE, transaction_rows=TRANSACTION_ROWS, progress=None):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.transaction_rows = transaction_rows
+        self.progress = progress
+        self.counts = {}
+        self.started = time.perf_counter()
+        self._buffers = {}  # 表 -> 待写入的行，按首次出现的顺序
+        self._buffered = 0
+        self._uncommitted = 0
+        self._transaction = None
+
+    def add(self, table, row):
+        buffer = self._buffers.setdefault(table, [])
+        # executemany 要求同一批的行具有相同的列
+        if buffer and buffer[0].keys() != row.keys():
+            self.flush()
+            buffer = self._buffers.setdefault(table, [])
+        buffer.append(row)
+        self._buffered += 1
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        if self._transaction is None:
+            self._transaction = self.connection.begin()
+        for table, rows in self._buffers.items():
+            if rows:
+                self.connection.execute(table.insert(), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+        self._uncommitted += self._buffered
+        self._buffers = {}
+        self._buffered = 0
+        if self._uncommitted >= self.transaction_rows:
+            self.commit()
+
+    def commit(self):
+        if self._transaction is not None:
+            self._transaction.commit()
+            self._transaction = None
+            self._uncommitted = 0
+            if self.progress:
+                self.progress(self.counts, time.perf_counter() - self.started)
+
+    def finish(self):
+        self.flush()
+        self.commit()
+        return self.counts, time.perf_counter() - self.started
+
+    def rollback(self):
+        if self._transaction is not None:
+            self._transaction.rollback()
+            self._transaction = None
+
+
+def _is_empty(connection, table):
+    return connection.execute(db.select(db.literal_column('1')).select_from(table).limit(1)).first() is None
+
+
+@contextmanager
+def _relaxed_connection(relax_checks):
+    """专用连接；写入期间放宽数据库设置，结束后恢复"""
+    with db.engine.connect() as connection:
+        dialect = connection.dialect.name
+        restore = []
+        if dialect == 'sqlite':
+            synchronous = connection.execute(text('PRAGMA synchronous')).scalar()
+            connection.execute(text('PRAGMA synchronous = OFF'))
+            restore.append(f'PRAGMA synchronous = {synchronous}')
+        elif dialect == 'mysql' and relax_checks:
+            checks = connection.execute(text('SELECT @@unique_checks, @@foreign_key_checks')).first()
+            connection.execute(text('SET unique_checks = 0, foreign_key_checks = 0'))
+            restore.append(f'SET unique_checks = {int(checks[0])}, foreign_key_checks = {int(checks[1])}')
+        connection.commit()
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            for statement in restore:
+                connection.execute(text(statement))
+            connection.commit()
+
+
+@contextmanager
+def _deferred_indexes(connection, tables):
+    """空表先删除非唯一索引，写完后重建"""
+    dropped = []
+    for table in tables:
+        if not _is_empty(connection, table):
+            continue
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if not index.unique:
+                index.drop(connection)
+                dropped.append(index)
+    connection.commit()
+    try:
+        yield
+    finally:
+        for index in dropped:
+            index.create(connection)
+        connection.commit()
+
+
+def bulk_load(tables, rows, chunk_size=CHUNK_SIZE, transaction_rows=TRANSACTION_ROWS,
+              defer_indexes=True, relax_checks=False, progress=None):
+    """写入 (表, 行字典) 序列，返回 ({表名: 行数}, 耗时秒数)
+
+    :param tables: 会写入的表，用于推迟索引
+    :param relax_checks: 数据可信（如生成的数据）时关闭 MySQL 的唯一性和外键检查
+    :param progress: 每次提交后调用 progress(counts, elapsed)
+    """
+    with _relaxed_connection(relax_checks) as connection:
+        with _deferred_indexes(connection, tables) if defer_indexes else nullcontext():
+            loader = BulkLoader(connection, chunk_size, transaction_rows, progress)
+            try:
+                for table, row in rows:
+                    loader.add(table, row)
+                return loader.finish()
+            except Exception:
+                loader.rollback()
+                raise
+
+
+def refresh_derived_data(tables):
+    """直接写入后重建派生数据并失效缓存"""
+    from app.category_cache import category_cache
+    from app.page_cache import invalidate_products
+    from app.sales_rollup import rebuild_rollups
+    from app.search import get_search_backend
+
+    names = {table.name for table in tables}
+    if names & {'orders', 'order_items'}:
+        Product.rebuild_sales_count()
+        rebuild_rollups()
+    if 'products' in names:
+        get_search_backend().rebuild()
+    if 'categories' in names:
+        category_cache.invalidate()
+    if names & {'products', 'orders', 'order_items', 'categories'}:
+        invalidate_products([category_id for category_id, in db.session.query(Category.id)])
+
+
+# ---------- 合成数据 ----------
+
+def _rng(kind, seed, row_id):
+    # 每行的数据只由种子和ID决定，可以分段生成、重复生成
+    return random.Random(f'{kind}:{seed}:{row_id}')
+
+
+def _next_id(model):
+    next_id = (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+    db.session.commit()  # 结束读事务，批量写入使用单独的连接
+    return next_id
+
+
+def _moment(rng, now, days=365):
+    return now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+def product_name(rng, product_id):
+    return f'{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)}{rng.choice(NOUNS)} {product_id}'
+
+
+def generate_products(count, start_id, category_ids, seed=42, now=None):
+    now = now or datetime.utcnow().replace(microsecond=0)
+    table = Product.__table__
+    for product_id in range(start_id, start_id + count):
+        rng = _rng('product', seed, product_id)
+        name = product_name(rng, product_id)
+        created = _moment(rng, now)
+        yield table, {
+            'id': product_id,
+            'name': name,
+            'description': f'{name}，编号 {product_id}',
+            'price': round(rng.uniform(9.9, 9999), 2),
+            'stock': rng.randint(100, 1000000),
+            'reserved': 0,
+            'sales_count': 0,
+            'image': 'default_product.png',
+            'created_at': created,
+            'updated_at': created,
+            'category_id': rng.choice(category_ids),
+        }
+
+
+def generate_users(count, start_id, password_hash, seed=42, now=None):
+    """用户名为 user + 7 位ID；所有用户使用同一个密码哈希，避免逐个计算哈希"""
+    now = now or datetime.utcnow().replace(microsecond=0)
+    table = User.__table__
+    for user_id in range(start_id, start_id + count):
+        rng = _rng('user', seed, user_id)
+        name = f'user{user_id:07d}'
+        yield table, {
+            'id': user_id,
+            'username': name,
+            'email': f'{name}@example.com',
+            'password_hash': password_hash,
+            'is_admin': False,
+            'is_active': True,
+            'created_at': _moment(rng, now),
+            'address': f'测试地址 {user_id} 号',
+        }
+
+
+def generate_orders(count, start_id, user_ids, product_ids, prices, seed=42, now=None):
+    """订单及订单项；前 10% 的用户产生一半的订单"""
+    now = now or datetime.utcnow().replace(microsecond=0)
+    orders, items = Order.__table__, OrderItem.__table__
+    heavy_users = max(1, len(user_ids) // 10)
+    for order_id in range(start_id, start_id + count):
+        rng = _rng('order', seed, order_id)
+        created = _moment(rng, now)
+        if rng.random() < 0.5:
+            user_id = user_ids[rng.randrange(heavy_users)]
+        else:
+            user_id = user_ids[rng.randrange(len(user_ids))]
+        lines = []
+        total = Decimal('0')
+        for _ in range(rng.randint(1, 4)):
+            index = rng.randrange(len(product_ids))
+            quantity = rng.randint(1, 3)
+            price = Decimal(str(prices[index])).quantize(Decimal('0.01'))
+            lines.append({'order_id': order_id, 'product_id': product_ids[index], 'quantity': quantity,
+                          'price': price, 'subtotal': price * quantity})
+            total += price * quantity
+        yield orders, {
+            'id': order_id,
+            'order_number': f'SEED{order_id:012d}',
+            'user_id': user_id,
+            'total_amount': total,
+            'status': rng.choice(ORDER_STATUSES),
+            'shipping_address': f'测试地址 {user_id} 号',
+            'payment_method': 'credit_card',
+            'created_at': created,
+            'updated_at': created,
+        }
+        for line in lines:
+            yield items, line
+
+
+def _ensure_categories():
+    if not db.session.query(Category.id).first():
+        db.session.execute(db.insert(Category), [{'name': name, 'description': description}
+                                                 for name, description in DEFAULT_CATEGORIES])
+        db.session.commit()
+    return [category_id for category_id, in db.session.query(Category.id).order_by(Category.id)]
+
+
+def seed_catalog(products=0, users=0, orders=0, seed=42, password='seed123',
+                 chunk_size=CHUNK_SIZE, transaction_rows=TRANSACTION_ROWS, progress=None):
+    """在现有数据之后追加生成的商品、用户和订单，返回 [(表名, 行数, 耗时)]"""
+    from app.passwords import password_hasher
+
+    results = []
+    options = dict(chunk_size=chunk_size, transaction_rows=transaction_rows, relax_checks=True,
+                   progress=progress)
+    now = datetime.utcnow().replace(microsecond=0)
+    category_ids = _ensure_categories()
+
+    if products:
+        counts, elapsed = bulk_load([Product.__table__], generate_products(
+            products, _next_id(Product), category_ids, seed, now), **options)
+        results += [(name, rows, elapsed) for name, rows in counts.items()]
+
+    if users:
+        counts, elapsed = bulk_load([User.__table__], generate_users(
+            users, _next_id(User), password_hasher.hash(password), seed, now), **options)
+        results += [(name, rows, elapsed) for name, rows in counts.items()]
+
+    if orders:
+        # 只保存ID和价格两列，百万级商品也只占十几 MB
+        user_ids = array('q', (user_id for user_id, in db.session.query(User.id).order_by(User.id)))
+        product_ids, prices = array('q'), array('d')
+        for product_id, price in db.session.query(Product.id, Product.price).order_by(Product.id).yield_per(10000):
+            product_ids.append(product_id)
+            prices.append(price)
+        db.session.commit()
+        if not user_ids or not product_ids:
+            raise ValueError('生成订单前需要先有用户和商品')
+        counts, elapsed = bulk_load([Order.__table__, OrderItem.__table__], generate_orders(
+            orders, _next_id(Order), user_ids, product_ids, prices, seed, now), **options)
+        results += [(name, rows, elapsed) for name, rows in counts.items()]
+
+    touched = [table for table in (Product.__table__, User.__table__, Order.__table__)
+               if any(name == table.name for name, _, _ in results)]
+    refresh_derived_data(touched)
+    return results
+
+
+# ---------- 文件导入 ----------
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')  # 兼容 Excel 保存的带 BOM 的 CSV
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f'无法根据文件名判断格式：{path}，请指定 --format')
+
+
+def iter_rows(f, fmt):
+    """逐行读取已打开的文本流：CSV（首行为列名）或 JSONL"""
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+        return
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'第 {number} 行不是有效的 JSON：{e}')
+
+
+def read_rows(path, fmt=None):
+    """逐行读取 CSV 或 JSONL 文件"""
+    fmt = fmt or detect_format(path)
+    with _open_text(path) as f:
+        yield from iter_rows(f, fmt)
+
+
+def coerce_value(column, value):
+    if value is None:
+        return None
+    column_type = column.type
+    if isinstance(value, str):
+        if value == '' and not isinstance(column_type, db.String):
+            return None
+        if isinstance(column_type, db.Boolean):
+            return value.strip().lower() in ('1', 'true', 'yes', 'y', 't')
+        if isinstance(column_type, db.Integer):
+            return int(value)
+        if isinstance(column_type, db.DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(column_type, db.Date):
+            return date.fromisoformat(value)
+    if isinstance(column_type, db.Float):
+        return float(value)
+    if isinstance(column_type, db.Numeric):
+        return Decimal(str(value))
+    return value
+
+
+def coerce_rows(table, rows):
+    """把文件中的值转换为列类型；password 列会被计算为 password_hash"""
+    columns = table.columns
+    for number, row in enumerate(rows, 1):
+        if table.name == 'users' and row.get('password') and not row.get('password_hash'):
+            from app.passwords import password_hasher
+            row = dict(row, password_hash=password_hasher.hash(row['password']))
+        row.pop('password', None)
+        unknown = [key for key in row if key not in columns]
+        if unknown:
+            raise ValueError(f'第 {number} 行包含 {table.name} 表没有的列：{", ".join(unknown)}')
+        try:
+            yield table, {key: coerce_value(columns[key], value) for key, value in row.items()}
+        except ValueError as e:
+            raise ValueError(f'第 {number} 行数据无效：{e}')
+
+
+def import_file(table_name, path, fmt=None, chunk_size=CHUNK_SIZE, transaction_rows=TRANSACTION_ROWS,
+                progress=None):
+    """导入 CSV / JSONL 文件到指定表，返回 (行数, 耗时)
+
+    出错时回滚当前未提交的事务，之前已提交的数据保留。
+    """
+    table = IMPORT_TABLES[table_name].__table__
+    counts, elapsed = bulk_load([table], coerce_rows(table, read_rows(path, fmt)),
+                                chunk_size=chunk_size, transaction_rows=transaction_rows, progress=progress)
+    refresh_derived_data([table])
+    return counts.get(table.name, 0), elapsed
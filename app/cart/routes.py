@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app import db
 from app.models import Product, Cart, CartItem
+from app.inventory import available_for
 from datetime import datetime  # 添加这行
 
 # 使用与__init__.py中一致的蓝图名称
@@ -30,7 +31,7 @@ def add_to_cart(product_id):
 
     # 检查库存
     quantity = request.form.get('quantity', 1, type=int)
-    if product.stock < quantity:
+    if available_for(current_user.id, product) < quantity:
         flash('库存不足', 'error')
         return redirect(request.referrer or url_for('main.index'))
 
@@ -54,6 +55,8 @@ def add_to_cart(product_id):
         )
         db.session.add(cart_item)
 
+    # 更新购物车汇总（按购物车项的价格快照计算）
+    cart.adjust_totals(quantity, cart_item.price * quantity)
     db.session.commit()
     flash(f'已添加 {product.name} 到购物车', 'success')
 
@@ -82,11 +85,13 @@ def update_cart_item(item_id):
     quantity = request.form.get('quantity', 1, type=int)
 
     # 检查库存
-    if cart_item.product.stock < quantity:
+    if available_for(current_user.id, cart_item.product) < quantity:
         flash('库存不足', 'error')
         return redirect(url_for('cart.view_cart'))
 
+    delta = quantity - cart_item.quantity
     cart_item.quantity = quantity
+    cart_item.cart.adjust_totals(delta, cart_item.price * delta)
     db.session.commit()
     flash('购物车已更新', 'success')
     return redirect(url_for('cart.view_cart'))
@@ -103,6 +108,7 @@ def remove_from_cart(item_id):
         flash('无权操作', 'error')
         return redirect(url_for('cart.view_cart'))
 
+    cart_item.cart.adjust_totals(-cart_item.quantity, -cart_item.price * cart_item.quantity)
     db.session.delete(cart_item)
     db.session.commit()
     flash('已从购物车移除商品', 'success')
@@ -116,6 +122,7 @@ def clear_cart():
     cart = Cart.query.filter_by(user_id=current_user.id).first()
     if cart:
         cart.items.delete()
+        cart.reset_totals()
         db.session.commit()
         flash('购物车已清空', 'success')
     return redirect(url_for('cart.view_cart'))
@@ -0,0 +1,101 @@
+"""进程内分类缓存
+
+分类几乎不变，但每次渲染模板都会用到。缓存保存分类的只读快照，并用一个
+版本文件（instance/category_cache.version）在多个 gunicorn worker 之间同步：
+任一进程提交了分类修改，就替换版本文件，其他进程在下次读取时通过 stat
+发现版本变化并重新加载，不需要查询数据库。另设 TTL 作为兜底（如多台主机部署）。
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+CachedCategory = namedtuple('CachedCategory', 'id name description')
+
+
+class CategoryCache:
+    def __init__(self):
+        self.version_file = None
+        self.ttl = 300
+        self._lock = threading.Lock()
+        self._categories = None
+        self._stamp = None
+        self._loaded_at = 0
+
+    def init_app(self, app):
+        os.makedirs(app.instance_path, exist_ok=True)
+        self.version_file = os.path.join(app.instance_path, 'category_cache.version')
+        self.ttl = app.config.get('CATEGORY_CACHE_TTL', 300)
+        app.extensions['category_cache'] = self
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.version_file)
+        except (OSError, TypeError):
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load(self):
+        from app.models import Category
+
+        rows = db.session.query(Category.id, Category.name, Category.description)\
+            .order_by(Category.name).all()
+        return [CachedCategory(*row) for row in rows]
+
+    def get(self):
+        """返回按名称排序的分类快照列表"""
+        stamp = self._current_stamp()
+        categories = self._categories
+        if (categories is not None and stamp == self._stamp
+                and time.monotonic() - self._loaded_at < self.ttl):
+            return categories
+        with self._lock:
+            if self._categories is None or stamp != self._stamp \
+                    or time.monotonic() - self._loaded_at >= self.ttl:
+                self._categories = self._load()
+                self._stamp = stamp
+                self._loaded_at = time.monotonic()
+            return self._categories
+
+    def invalidate(self):
+        """清空本进程缓存并更新版本文件，通知其他进程"""
+        with self._lock:
+            self._categories = None
+        if not self.version_file:
+            return
+        tmp = f'{self.version_file}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(time.time_ns()))
+        # 原子替换，inode 变化即版本变化
+        os.replace(tmp, self.version_file)
+
+
+category_cache = CategoryCache()
+
+
+def get_categories():
+    return category_cache.get()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_category_changes(session, flush_context):
+    from app.models import Category
+
+    if any(isinstance(obj, Category) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['categories_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('categories_changed', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('categories_changed', None)
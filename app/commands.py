@@ -0,0 +1,163 @@
+import os
+
+import click
+
+
+def register_commands(app):
+    """注册命令行命令"""
+
+    @app.cli.command('rebuild-sales-count')
+    def rebuild_sales_count():
+        """根据订单项重建商品销量"""
+        from app.models import Product
+
+        updated = Product.rebuild_sales_count()
+        click.echo(f'已重建 {updated} 个商品的销量')
+
+    @app.cli.command('rebuild-cart-totals')
+    def rebuild_cart_totals():
+        """根据购物车项重建购物车汇总"""
+        from app.models import Cart
+
+        updated = Cart.rebuild_totals()
+        click.echo(f'已重建 {updated} 个购物车的汇总')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """重建商品全文搜索索引"""
+        from app.search import get_search_backend
+
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        click.echo(f'已使用 {backend.name} 后端索引 {indexed} 个商品')
+
+    @app.cli.command('release-expired-holds')
+    @click.option('--batch-size', default=500, show_default=True, help='每批释放的锁定数')
+    def release_expired_holds(batch_size):
+        """释放过期的库存锁定（建议由 cron 每分钟执行）"""
+        from app.inventory import release_expired_holds
+
+        released = release_expired_holds(batch_size)
+        click.echo(f'已释放 {released} 条过期库存锁定')
+
+    @app.cli.command('stress-order-numbers')
+    @click.option('--processes', default=8, show_default=True, help='并发进程数')
+    @click.option('--count', default=100000, show_default=True, help='每个进程生成的订单号数量')
+    def stress_order_numbers(processes, count):
+        """多进程并发生成订单号，检查是否有重复"""
+        from app.snowflake import stress_test
+
+        total, duplicates, elapsed = stress_test(processes, count)
+        click.echo(f'{processes} 个进程共生成 {total} 个订单号，重复 {duplicates} 个，'
+                   f'耗时 {elapsed:.2f} 秒（{total / elapsed:.0f} 个/秒）')
+        if duplicates:
+            raise SystemExit(1)
+
+    @app.cli.command('rebuild-sales-rollups')
+    def rebuild_sales_rollups():
+        """从订单表重建仪表板使用的销售汇总"""
+        from app.sales_rollup import rebuild_rollups
+
+        rows = rebuild_rollups()
+        click.echo(f'已重建 {rows} 行销售汇总')
+
+    @app.cli.command('mail-flush')
+    def mail_flush():
+        """在当前进程发送邮件队列中所有到期的邮件"""
+        from app.mail_queue import mail_queue
+
+        processed = mail_queue.flush()
+        stats = mail_queue.stats()
+        click.echo(f'已处理 {processed} 封邮件；待发送 {stats["new"]} 封，失败 {stats["failed"]} 封')
+
+    @app.cli.command('mail-status')
+    def mail_status():
+        """查看邮件队列中各状态的邮件数"""
+        from app.mail_queue import mail_queue
+
+        stats = mail_queue.stats()
+        click.echo(f'待发送 {stats["new"]} 封，发送中 {stats["work"]} 封，失败 {stats["failed"]} 封'
+                   f'（{mail_queue.spool_dir}）')
+
+    @app.cli.command('rotate-user-logs')
+    @click.option('--retention-months', type=int, help='保留的月数，默认取 USER_LOG_RETENTION_MONTHS')
+    @click.option('--batch-size', default=5000, show_default=True, help='每个事务移动或归档的行数')
+    def rotate_user_logs(retention_months, batch_size):
+        """把早于本月的用户日志移入月表，并归档超过保留期的月表（建议由 cron 每天执行）"""
+        from flask import current_app
+        from app.user_log_buckets import archive_dir, rotate_logs
+
+        if retention_months is None:
+            retention_months = current_app.config['USER_LOG_RETENTION_MONTHS']
+        moved, archived = rotate_logs(retention_months, batch_size,
+                                      progress=lambda step, rows: click.echo(f'  {step}: 已处理 {rows} 行'))
+        click.echo(f'已将 {moved} 条日志移入月表')
+        for table, rows in archived.items():
+            click.echo(f'已归档 {table}：{rows} 行 -> {archive_dir()}')
+
+    @app.cli.command('process-images')
+    @click.option('--processes', type=int, default=os.cpu_count(), show_default=True, help='并行处理的进程数')
+    @click.option('--force', is_flag=True, help='重新生成已有的规格文件（修改规格参数后使用）')
+    def process_images(processes, force):
+        """为现有商品图片生成各规格文件；尚未处理的图片（按文件名保存的）改为按内容哈希命名"""
+        from app.images import process_catalog
+
+        stats = process_catalog(processes, force,
+                                progress=lambda done: click.echo(f'  已处理 {done} 张图片'))
+        click.echo(f'处理 {stats["processed"]} 张图片，更新 {stats["updated"]} 个商品，'
+                   f'跳过 {stats["skipped"]} 个已处理的商品，{stats["missing"]} 个商品找不到图片文件，'
+                   f'{len(stats["failed"])} 张图片处理失败')
+        for source, error in stats['failed'][:20]:
+            click.echo(f'  {source}: {error}')
+
+    @app.cli.command('build-assets')
+    def build_assets():
+        """构建带内容哈希的静态资源和预压缩文件，写入 app/static/dist/manifest.json"""
+        from app.assets import build_assets as build
+
+        stats = build(app.static_folder)
+        click.echo(f'共 {stats["files"]} 个文件，新写入 {stats["written"]} 个，'
+                   f'生成 {stats["compressed"]} 个预压缩文件，清理 {stats["removed"]} 个旧文件')
+        if not stats['brotli']:
+            click.echo('未安装 brotli，只生成了 .gz 文件')
+
+    @app.cli.command('seed')
+    @click.option('--products', default=1000, show_default=True, help='生成的商品数')
+    @click.option('--users', default=100, show_default=True, help='生成的用户数')
+    @click.option('--orders', default=1000, show_default=True, help='生成的订单数（每单 1-4 个订单项）')
+    @click.option('--seed', 'seed_value', default=42, show_default=True, help='随机数种子')
+    @click.option('--password', default='seed123', show_default=True, help='生成用户的密码')
+    @click.option('--chunk-size', default=5000, show_default=True, help='每次 executemany 的行数')
+    @click.option('--transaction-rows', default=50000, show_default=True, help='每个事务写入的行数')
+    def seed(products, users, orders, seed_value, password, chunk_size, transaction_rows):
+        """在现有数据之后批量生成商品、用户和订单"""
+        from app.bulk_load import seed_catalog
+
+        results = seed_catalog(products, users, orders, seed=seed_value, password=password,
+                               chunk_size=chunk_size, transaction_rows=transaction_rows,
+                               progress=_report_progress)
+        for table, rows, elapsed in results:
+            click.echo(f'{table}: {rows} 行，{elapsed:.1f} 秒（{rows / max(elapsed, 1e-9):.0f} 行/秒）')
+
+    @app.cli.command('import')
+    @click.argument('table', type=click.Choice(['categories', 'products', 'users', 'orders', 'order_items']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='文件格式，默认按扩展名判断')
+    @click.option('--chunk-size', default=5000, show_default=True, help='每次 executemany 的行数')
+    @click.option('--transaction-rows', default=50000, show_default=True, help='每个事务写入的行数')
+    def import_rows(table, path, fmt, chunk_size, transaction_rows):
+        """从 CSV / JSONL 文件（可为 .gz）批量导入数据"""
+        from app.bulk_load import import_file
+
+        try:
+            rows, elapsed = import_file(table, path, fmt, chunk_size=chunk_size,
+                                        transaction_rows=transaction_rows, progress=_report_progress)
+        except ValueError as e:
+            raise click.ClickException(f'导入失败（此前已提交的批次会保留）：{e}')
+        click.echo(f'{table}: 导入 {rows} 行，{elapsed:.1f} 秒（{rows / max(elapsed, 1e-9):.0f} 行/秒）')
+
+
+def _report_progress(counts, elapsed):
+    total = sum(counts.values())
+    detail = '，'.join(f'{table} {rows}' for table, rows in counts.items())
+    click.echo(f'  已提交 {detail} 行（{total / max(elapsed, 1e-9):.0f} 行/秒）')
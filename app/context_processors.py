@@ -1,7 +1,8 @@
 ﻿from datetime import datetime
-from app.models import Category
+from app.category_cache import get_categories
 from flask_login import current_user
-from app.models import Cart, CartItem
+from app import db
+from app.models import Cart
 
 
 def inject_now():
@@ -10,10 +11,9 @@ def inject_now():
 
 
 def inject_categories():
-    """注入分类列表"""
+    """注入分类列表（读取进程内缓存，不查询数据库）"""
     try:
-        categories = Category.query.order_by(Category.name).all()
-        return {'categories': categories}
+        return {'categories': get_categories()}
     except:
         return {'categories': []}
 
@@ -27,10 +27,12 @@ def inject_cart_info():
 
     if current_user.is_authenticated:
         try:
-            cart = Cart.query.filter_by(user_id=current_user.id).first()
-            if cart:
-                cart_items_count = cart.total_quantity
-                cart_total_amount = float(cart.total_price)
+            # 只读取汇总字段，一次按 user_id 的索引查询
+            totals = db.session.query(Cart.item_count, Cart.total_amount)\
+                .filter_by(user_id=current_user.id).first()
+            if totals:
+                cart_items_count = totals.item_count
+                cart_total_amount = float(totals.total_amount)
         except:
             # 数据库可能还没有准备好
             pass
@@ -0,0 +1,135 @@
+"""数据库连接池配置与统计
+
+- 连接池参数由环境变量配置（见 config.py 的 SQLALCHEMY_ENGINE_OPTIONS）；
+- 使用 TimedQueuePool 记录每个进程获取连接的次数、等待时间和超时次数；
+- 进程 fork 后（gunicorn worker）丢弃继承的连接池，子进程不会与父进程共用数据库连接。
+
+统计数据按进程保存，可在后台 /admin/pool-stats 查看处理该请求的 worker 的连接池状态。
+"""
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+# 获取连接超过该时间（秒）计为慢获取
+SLOW_CHECKOUT_SECONDS = 0.1
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """记录获取连接耗时（含排队等待、新建连接和 pre-ping）的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _should_wrap_creator(self, creator):
+        # 所有新建的数据库连接都经过这里，包括 pre-ping 或出错后失效的连接记录重连
+        # （_ConnectionRecord 直接调用 pool._invoke_creator，不经过 _create_connection）
+        invoke_creator = super()._should_wrap_creator(creator)
+
+        def counted(connection_record):
+            connection = invoke_creator(connection_record)
+            self.stats.increment('connects')
+            return connection
+        return counted
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.increment('timeouts')
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+
+def configure_pool(app):
+    """在创建引擎之前调用：为可使用 QueuePool 的数据库启用 TimedQueuePool"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        return  # 内存 SQLite 只能使用单连接池
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('poolclass', TimedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+# 弱引用：测试等场景反复 create_app 时，已释放的应用不会留在这里
+_apps = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def _dispose_after_fork():
+    # close=False：不关闭父进程仍在使用的连接，只让子进程丢弃它们并重新建立
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def init_app(app):
+    """在 db.init_app 之后调用"""
+    global _fork_hook_registered
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_dispose_after_fork)
+        _fork_hook_registered = True
+    _apps.add(app)
+
+
+def pool_stats():
+    """当前进程各数据库引擎的连接池状态"""
+    engines = {}
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        info = {'pool': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            info.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'timeout': pool.timeout(),
+            })
+        if isinstance(pool, TimedQueuePool):
+            info.update(pool.stats.as_dict())
+        engines[name or 'default'] = info
+    return {'pid': os.getpid(), 'engines': engines}
@@ -0,0 +1,115 @@
+"""只读副本路由
+
+在 SQLALCHEMY_BINDS 中配置名称以 replica 开头的只读副本（由环境变量
+DATABASE_REPLICA_URLS 以逗号分隔给出），标记为只读的路由或代码块中的 SELECT
+按轮询发往副本，其他查询和所有写操作仍使用主库。
+
+读己之写：
+- 同一请求中一旦写过数据库，之后的查询都使用主库；
+- 提交过写操作后，在会话 cookie 中记录 DB_PRIMARY_STICKY_SECONDS 秒的时间窗，
+  窗口内该用户的后续请求全部使用主库，避免副本延迟导致刚提交的修改“消失”。
+
+本地可以用两个 SQLite 文件测试：把开发库复制一份作为副本，
+    DATABASE_REPLICA_URLS=sqlite:////path/to/replica.db
+"""
+import itertools
+import threading
+import time
+from contextlib import ContextDecorator
+
+from flask import g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select, TextClause
+
+STICKY_SESSION_KEY = '_db_primary_until'
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.bind_keys = []
+        self.sticky_seconds = 5
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        self.bind_keys = sorted(key for key in binds if key.startswith('replica'))
+        self.sticky_seconds = app.config.get('DB_PRIMARY_STICKY_SECONDS', 5)
+        self._cycle = itertools.cycle(self.bind_keys) if self.bind_keys else None
+        app.extensions['replica_router'] = self
+
+    def next_bind_key(self):
+        if self._cycle is None:
+            return None
+        with self._lock:
+            return next(self._cycle)
+
+
+replica_router = ReplicaRouter()
+
+
+class read_only(ContextDecorator):
+    """标记只读：其中的 SELECT 可以发往只读副本
+
+    可用作视图装饰器，也可用作 with 代码块（需在应用上下文中）。
+    """
+
+    # 作为装饰器时同一个实例会被多个线程同时使用，状态只能保存在 g 中
+    def __enter__(self):
+        g.db_read_only_depth = g.get('db_read_only_depth', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        g.db_read_only_depth -= 1
+        return False
+
+
+def _sticky_to_primary():
+    return has_request_context() and session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def _is_read(clause):
+    if isinstance(clause, Select):
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip()[:6].upper() == 'SELECT'
+    return False
+
+
+class RoutingSession(Session):
+    """只读场景下把 SELECT 发往副本的会话"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            if 'db_replica' not in g:
+                # 同一请求固定使用一个副本，避免前后查询看到不同的复制进度
+                g.db_replica = replica_router.next_bind_key()
+            if g.db_replica is not None:
+                return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        return (replica_router.bind_keys
+                and has_app_context()
+                and g.get('db_read_only_depth', 0) > 0
+                and not self.info.get('db_wrote')
+                and _is_read(clause)
+                and not _sticky_to_primary())
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush_write(session, flush_context):
+    session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_after_commit(db_session):
+    if db_session.info.get('db_wrote') and replica_router.bind_keys and has_request_context():
+        session[STICKY_SESSION_KEY] = time.time() + replica_router.sticky_seconds
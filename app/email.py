@@ -1,26 +1,15 @@
-from threading import Thread
 from flask import current_app, render_template
-from flask_mail import Message
-from app import mail
-
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+from app.mail_queue import mail_queue
 
 
 def send_email(to, subject, template, **kwargs):
+    """渲染邮件并放入发送队列，由后台线程批量发送"""
     app = current_app._get_current_object()
-    msg = Message(subject=subject,
-                  sender=app.config['MAIL_USERNAME'],
-                  recipients=[to])
-    msg.body = render_template(template + '.txt', **kwargs)
-    msg.html = render_template(template + '.html', **kwargs)
-
-    # 异步发送
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+    mail_queue.enqueue(subject=subject,
+                       recipients=[to],
+                       body=render_template(template + '.txt', **kwargs),
+                       html=render_template(template + '.html', **kwargs),
+                       sender=app.config['MAIL_USERNAME'])
 
 
 def send_order_confirmation(order, user):
@@ -30,4 +19,4 @@ def send_order_confirmation(order, user):
         'email/order_confirmation',
         order=order,
         user=user
-    )
\ No newline at end of file
+    )
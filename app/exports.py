@@ -0,0 +1,78 @@
+"""流式导出（后台商品、订单导出共用）
+
+行由调用方以生成器给出（查询用 yield_per 分批读取），这里按批序列化为 CSV / JSONL，
+可选再即时 gzip 压缩，通过 stream_with_context 边查询边发送，不在内存中拼出完整结果。
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from app.fastjson import dumps
+
+BATCH = 1000  # 每批输出的行数
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def csv_chunks(rows, columns):
+    """生成 CSV 文本块；带 BOM，Excel 可直接打开"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    buffer.write('﻿')
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(rows):
+    """生成 JSONL 字节块"""
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) >= BATCH:
+            yield b'\n'.join(chunk) + b'\n'
+            chunk = []
+    if chunk:
+        yield b'\n'.join(chunk) + b'\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """把字节块即时压缩为 gzip 流"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16+：gzip 头
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows, columns, fmt, name, compress=False):
+    """返回以附件下载的流式响应
+
+    rows 为生成器函数（在响应开始发送后才执行查询），调用时不带参数；
+    文件名为 name-时间.fmt[.gz]。
+    """
+    def generate():
+        if fmt == 'csv':
+            chunks = (chunk.encode('utf-8') for chunk in csv_chunks(rows(), columns))
+        else:
+            chunks = jsonl_chunks(rows())
+        yield from (gzip_chunks(chunks) if compress else chunks)
+
+    filename = f'{name}-{datetime.now():%Y%m%d%H%M%S}.{fmt}'
+    if compress:
+        filename += '.gz'
+    return Response(stream_with_context(generate()),
+                    mimetype='application/gzip' if compress else MIMETYPES[fmt],
+                    headers={
+                        'Content-Disposition': f'attachment; filename={filename}',
+                        'X-Accel-Buffering': 'no',  # nginx 不缓冲，边生成边下载
+                    })
@@ -0,0 +1,19 @@
+"""JSON 序列化
+
+安装了 orjson 时使用 orjson（比标准库快数倍），否则退回标准库 json。
+两种实现都输出不转义中文的 UTF-8 字节串；Decimal 等不能直接序列化的值转为字符串。
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+def dumps(obj):
+    """序列化为 UTF-8 编码的 JSON 字节串"""
+    if orjson is not None:
+        # 数据库结果的列名是 str 的子类（quoted_name），需 OPT_NON_STR_KEYS 才能作为键
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
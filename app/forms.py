@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, \
     TextAreaField, FloatField, IntegerField, SelectField, HiddenField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, \
@@ -39,8 +40,18 @@ class ProductForm(FlaskForm):
     price = FloatField('价格', validators=[DataRequired(), NumberRange(min=0.01)])
     stock = IntegerField('库存', validators=[DataRequired(), NumberRange(min=0)])
     category_id = SelectField('分类', coerce=int, validators=[DataRequired()])
+    image_file = FileField('商品图片', validators=[FileAllowed(['png', 'jpg', 'jpeg', 'gif', 'webp'], '只支持 PNG、JPEG、GIF、WebP 图片')])
     submit = SubmitField('保存')
 
+    def validate_image_file(self, field):
+        # 只检查图片；各规格文件在表单全部校验通过后由视图生成（image_processor.save_upload）
+        if field.data:
+            from app.images import image_processor
+            try:
+                image_processor.check_upload(field.data)
+            except ValueError as e:
+                raise ValidationError(str(e))
+
 
 class CategoryForm(FlaskForm):
     name = StringField('分类名称', validators=[DataRequired(), Length(max=50)])
@@ -0,0 +1,342 @@
+"""商品图片处理
+
+上传的原图只解码一次，生成固定尺寸的缩略图（thumb）、列表卡片（card）和详情（detail）
+三种规格，每种输出 WebP 和 JPEG 两种格式，由模板按显示位置选择（见 templates/product_image.html）。
+
+文件名由内容决定：products.image 保存原图内容的哈希（图片键），规格文件名为
+<键>-<规格>-<规格参数哈希>.<扩展名>。内容或规格参数变化时文件名随之变化，
+nginx 可以把这些文件当作不可变资源长期缓存。原图按图片键保存在 IMAGE_ORIGINALS_DIR，
+修改规格参数后用 flask process-images --force 重新生成。
+
+解码和缩放在进程池中执行（IMAGE_POOL_SIZE 为 0 时在当前进程执行），
+不占用 gunicorn worker 的 GIL；批量处理时各图片并行。
+"""
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from flask import url_for
+from PIL import Image, ImageOps
+
+from app.assets import static_url
+
+# 规格：(宽, 高, 是否裁剪填满)；不裁剪时按比例缩小到不超过该尺寸
+VARIANTS = {
+    'thumb': (200, 200, True),    # 购物车、订单中的小图（显示约 100px，按 2 倍屏生成）
+    'card': (600, 400, True),     # 首页、搜索的商品卡片（显示高度 200px）
+    'detail': (1200, 1200, False),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+DEFAULT_IMAGE = 'images/default_product.png'
+KEY_PATTERN = re.compile(r'^[0-9a-f]{20}$')
+
+
+def _variant_tag(name):
+    """规格参数的哈希，规格或编码参数变化时文件名随之变化"""
+    return hashlib.sha1(repr((VARIANTS[name], FORMATS)).encode()).hexdigest()[:6]
+
+
+VARIANT_TAGS = {name: _variant_tag(name) for name in VARIANTS}
+
+
+def is_image_key(image):
+    return bool(image) and KEY_PATTERN.match(image) is not None
+
+
+def variant_path(key, variant, ext):
+    """规格文件相对于商品图片目录的路径（按键的前两位分目录）"""
+    return f'{key[:2]}/{key}-{variant}-{VARIANT_TAGS[variant]}.{ext}'
+
+
+def _flatten(image):
+    # 透明背景铺白色，JPEG 和 WebP 统一输出 RGB
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _resize(image, spec):
+    width, height, crop = spec
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.LANCZOS)
+    return resized
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def process_image(source, output_dir, originals_dir, max_pixels, force=False):
+    """处理一张图片（在进程池中执行），返回图片键
+
+    读取 source，按内容计算图片键，保存原图并生成各规格文件；文件已存在且未指定 force 时跳过。
+    图片无法识别或像素过多时抛出 ValueError。
+    """
+    with open(source, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha256(data).hexdigest()[:20]
+    targets = [(variant, ext, os.path.join(output_dir, variant_path(key, variant, ext)))
+               for variant in VARIANTS for ext in FORMATS]
+    if not force and all(os.path.exists(path) for _, _, path in targets):
+        return key
+
+    try:
+        image = Image.open(source)
+        original_format = image.format
+        if image.width * image.height > max_pixels:
+            raise ValueError(f'图片像素过多：{image.width}x{image.height}')
+        # JPEG 按需要的最大尺寸直接以缩小的比例解码（结果不小于请求的尺寸）
+        image.draft('RGB', max((w, h) for w, h, _ in VARIANTS.values()))
+        image = _flatten(ImageOps.exif_transpose(image))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f'无法识别的图片：{e}')
+    if original_format not in ORIGINAL_EXTENSIONS:
+        raise ValueError(f'不支持的图片格式：{original_format}')
+
+    original = os.path.join(originals_dir, f'{key}.{ORIGINAL_EXTENSIONS[original_format]}')
+    if not os.path.exists(original):
+        _write_atomic(original, lambda f: f.write(data))
+    for variant in VARIANTS:
+        resized = _resize(image, VARIANTS[variant])
+        for variant_name, ext, path in targets:
+            if variant_name == variant:
+                pil_format, options = FORMATS[ext]
+                _write_atomic(path, lambda f: resized.save(f, pil_format, **options))
+    return key
+
+
+class ImageProcessor:
+    def __init__(self):
+        self.app = None
+        self.output_dir = None
+        self.originals_dir = None
+        self.url_prefix = 'uploads/products'
+        self.pool_size = 2
+        self.max_pixels = 40000000
+        self._pid = None
+        self._executor = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'products')
+        self.url_prefix = os.path.relpath(self.output_dir, app.static_folder).replace(os.sep, '/')
+        self.originals_dir = app.config.get('IMAGE_ORIGINALS_DIR') \
+            or os.path.join(app.instance_path, 'product_images')
+        self.pool_size = app.config.get('IMAGE_POOL_SIZE', 2)
+        self.max_pixels = app.config.get('IMAGE_MAX_PIXELS', 40000000)
+        app.jinja_env.globals['product_image_url'] = product_image_url
+        app.jinja_env.globals['is_image_key'] = is_image_key
+        app.extensions['image_processor'] = self
+
+    def _get_executor(self):
+        if self.pool_size <= 0:
+            return None
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    # 与密码哈希相同：fork 出的 worker 各自用 spawn 启动进程池
+                    self._executor = ProcessPoolExecutor(max_workers=self.pool_size,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _args(self, source, force):
+        return source, self.output_dir, self.originals_dir, self.max_pixels, force
+
+    def check_upload(self, file_storage):
+        """只检查上传的图片（格式、像素数、文件是否完整），不解码像素也不写文件；无效时抛出 ValueError"""
+        stream = file_storage.stream
+        try:
+            with Image.open(stream) as image:
+                if image.format not in ORIGINAL_EXTENSIONS:
+                    raise ValueError(f'不支持的图片格式：{image.format}')
+                if image.width * image.height > self.max_pixels:
+                    raise ValueError(f'图片像素过多：{image.width}x{image.height}')
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            raise ValueError(f'无法识别的图片：{e}')
+        finally:
+            stream.seek(0)
+
+    def save_upload(self, file_storage):
+        """处理上传的图片（生成各规格文件），返回图片键；图片无效时抛出 ValueError
+
+        在表单全部校验通过、提交事务之前调用，校验失败的表单不会留下图片文件。
+        """
+        os.makedirs(self.originals_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.originals_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(file_storage.stream, f)
+            executor = self._get_executor()
+            if executor is None:
+                return process_image(*self._args(tmp, False))
+            return executor.submit(process_image, *self._args(tmp, False)).result()
+        finally:
+            os.unlink(tmp)
+
+    def has_variants(self, key):
+        return all(os.path.exists(os.path.join(self.output_dir, variant_path(key, variant, ext)))
+                   for variant in VARIANTS for ext in FORMATS)
+
+    def original_path(self, key):
+        for ext in ORIGINAL_EXTENSIONS.values():
+            path = os.path.join(self.originals_dir, f'{key}.{ext}')
+            if os.path.exists(path):
+                return path
+        return None
+
+    def process_many(self, sources, force=False, processes=None):
+        """并行处理多张图片，按完成顺序产出 (source, 图片键或 ValueError)
+
+        sources 可以是生成器，同时提交的任务数有上限，不会一次读入全部待处理的图片。
+        """
+        processes = processes or self.pool_size or 1
+        if processes <= 1:
+            for source in sources:
+                yield source, _call(process_image, *self._args(source, force))
+            return
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = {}
+            for source in sources:
+                pending[executor.submit(process_image, *self._args(source, force))] = source
+                if len(pending) >= processes * 4:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), _call(future.result)
+            for future in as_completed(pending):
+                yield pending[future], _call(future.result)
+
+
+def _call(func, *args):
+    try:
+        return func(*args)
+    except ValueError as e:
+        return e
+
+
+image_processor = ImageProcessor()
+
+
+def product_image_url(image, variant='card', ext='jpg'):
+    """商品图片指定规格和格式的地址；没有处理过的图片返回默认图片"""
+    if not is_image_key(image):
+        return static_url(DEFAULT_IMAGE)
+    return url_for('static', filename=f'{image_processor.url_prefix}/{variant_path(image, variant, ext)}')
+
+
+def _find_legacy_image(image, directories):
+    """按文件名保存的旧图片（上传目录或 static/images 下）"""
+    name = os.path.basename(image or '')
+    if not name or name == os.path.basename(DEFAULT_IMAGE):
+        return None
+    for directory in directories:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def process_catalog(processes=None, force=False, batch_size=1000, progress=None):
+    """为全部商品图片生成规格文件（需在应用上下文中调用），返回统计
+
+    已按内容命名的图片从保存的原图重新生成（没有缺少的规格文件且未指定 force 时跳过）；
+    按文件名保存的旧图片处理后把 products.image 改为图片键。同一图片只处理一次。
+    """
+    from flask import current_app
+    from app import db
+    from app.models import Product
+    from app.page_cache import invalidate_products
+
+    directories = [current_app.config['UPLOAD_FOLDER'], os.path.join(current_app.static_folder, 'images')]
+    stats = {'processed': 0, 'updated': 0, 'skipped': 0, 'missing': 0, 'failed': []}
+    waiting = {}    # 正在处理的旧图片 -> [(商品ID, 分类ID)]
+    finished = {}   # 已处理的旧图片 -> 图片键（失败为 None）
+    updates = []
+
+    def sources():
+        last_id = 0
+        while True:
+            rows = db.session.query(Product.id, Product.image, Product.category_id) \
+                .filter(Product.id > last_id).order_by(Product.id).limit(batch_size).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            for row in rows:
+                if is_image_key(row.image):
+                    if row.image in finished or (not force and image_processor.has_variants(row.image)):
+                        stats['skipped'] += 1
+                        continue
+                    finished[row.image] = row.image
+                    source = image_processor.original_path(row.image)
+                    if source is None:
+                        stats['missing'] += 1
+                    else:
+                        yield source
+                    continue
+                source = _find_legacy_image(row.image, directories)
+                if source is None:
+                    stats['missing'] += 1
+                elif source in finished:
+                    if finished[source]:
+                        updates.append((row.id, finished[source], row.category_id))
+                elif source in waiting:
+                    waiting[source].append((row.id, row.category_id))
+                else:
+                    waiting[source] = [(row.id, row.category_id)]
+                    yield source
+
+    def flush():
+        if not updates:
+            return
+        table = Product.__table__
+        db.session.execute(table.update().where(table.c.id == db.bindparam('_id'))
+                           .values(image=db.bindparam('_image')),
+                           [{'_id': product_id, '_image': key} for product_id, key, _ in updates])
+        db.session.commit()
+        # 批量更新绕过了 ORM 事件，手动失效页面缓存
+        invalidate_products({category_id for _, _, category_id in updates})
+        stats['updated'] += len(updates)
+        updates.clear()
+
+    for source, result in image_processor.process_many(sources(), force, processes):
+        if isinstance(result, ValueError):
+            stats['failed'].append((source, str(result)))
+            result = None
+        else:
+            stats['processed'] += 1
+            if progress and stats['processed'] % 100 == 0:
+                progress(stats['processed'])
+        if source in waiting:
+            finished[source] = result
+            if result:
+                updates.extend((product_id, result, category_id) for product_id, category_id in waiting[source])
+            del waiting[source]
+        if len(updates) >= batch_size:
+            flush()
+    flush()
+    return stats
@@ -0,0 +1,186 @@
+"""库存锁定
+
+打开结算页时为购物车中的每件商品锁定库存：
+    UPDATE products SET reserved = reserved + :qty WHERE id = :id AND stock - reserved >= :qty
+下单时按锁定扣减库存，锁定过期后由清理任务（flask release-expired-holds）分批释放。
+
+锁定的处理（下单、重新锁定、过期释放）都先用一条 UPDATE 给锁定记录写入自己的
+claim_token，再只处理带有该令牌的记录，因此并发的下单和清理不会重复释放同一条锁定。
+所有操作都只锁定涉及的商品行，不加表锁。
+
+取消订单时先用条件 UPDATE 修改订单状态，只有一个并发请求能成功，再用一条 UPDATE 归还库存。
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import InventoryHold, Order, OrderItem, Product
+from app.sales_rollup import change_order_status
+
+
+def _claim(*criteria):
+    """认领符合条件且未被认领的锁定，返回 (令牌, {商品ID: 锁定数量})"""
+    token = uuid.uuid4().hex
+    db.session.execute(
+        db.update(InventoryHold)
+        .where(InventoryHold.claim_token.is_(None), *criteria)
+        .values(claim_token=token)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.session.query(InventoryHold.product_id, db.func.sum(InventoryHold.quantity))\
+        .filter(InventoryHold.claim_token == token)\
+        .group_by(InventoryHold.product_id)\
+        .all()
+    return token, {product_id: int(quantity) for product_id, quantity in rows}
+
+
+def _release(token, held):
+    """释放已认领的锁定：归还锁定库存并删除锁定记录"""
+    if held:
+        quantity = db.case(held, value=Product.id)
+        db.session.execute(
+            db.update(Product)
+            .where(Product.id.in_(held))
+            .values(reserved=Product.reserved - quantity)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(
+        db.delete(InventoryHold)
+        .where(InventoryHold.claim_token == token)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_user_holds(user_id):
+    """释放用户的全部锁定"""
+    token, held = _claim(InventoryHold.user_id == user_id)
+    _release(token, held)
+
+
+def place_holds(user_id, quantities):
+    """为用户重新锁定库存，返回锁定失败（可售库存不足）的商品ID集合
+
+    :param quantities: {商品ID: 数量}
+    """
+    release_user_holds(user_id)
+
+    minutes = current_app.config.get('INVENTORY_HOLD_MINUTES', 15)
+    expires_at = datetime.utcnow() + timedelta(minutes=minutes)
+    holds = []
+    failed = set()
+    for product_id, quantity in quantities.items():
+        result = db.session.execute(
+            db.update(Product)
+            .where(Product.id == product_id, Product.stock - Product.reserved >= quantity)
+            .values(reserved=Product.reserved + quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            holds.append({'user_id': user_id, 'product_id': product_id,
+                          'quantity': quantity, 'expires_at': expires_at})
+        else:
+            failed.add(product_id)
+    if holds:
+        db.session.execute(db.insert(InventoryHold), holds)
+    return failed
+
+
+def available_for(user_id, product):
+    """用户可购买的库存：可售库存加上该用户自己锁定的数量"""
+    held = db.session.query(db.func.coalesce(db.func.sum(InventoryHold.quantity), 0))\
+        .filter(InventoryHold.user_id == user_id,
+                InventoryHold.product_id == product.id,
+                InventoryHold.claim_token.is_(None))\
+        .scalar()
+    return product.available_stock + int(held)
+
+
+def claim_user_holds(user_id):
+    """下单前认领用户的全部锁定（包括已过期但尚未被清理的），返回 (令牌, {商品ID: 锁定数量})"""
+    return _claim(InventoryHold.user_id == user_id)
+
+
+def consume_holds(token, held, quantities):
+    """按锁定扣减库存并累加销量，返回是否全部扣减成功
+
+    没有锁定或锁定不足的部分按可售库存扣减：条件 stock - reserved + 本单锁定 >= 购买数量。
+    不在本单中的锁定一并释放。失败时调用方应回滚事务。
+    """
+    quantity = db.case(quantities, value=Product.id)
+    held_quantity = db.case({pid: held.get(pid, 0) for pid in quantities}, value=Product.id)
+    result = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(quantities),
+               Product.stock - Product.reserved + held_quantity >= quantity)
+        .values(stock=Product.stock - quantity,
+                reserved=Product.reserved - held_quantity,
+                sales_count=Product.sales_count + quantity,
+                updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        return False
+    _release(token, {pid: qty for pid, qty in held.items() if pid not in quantities})
+    return True
+
+
+def cancel_and_restock(order, statuses=('pending',)):
+    """取消订单并归还库存、扣回销量，返回涉及的分类ID集合；订单状态不允许取消时返回 None
+
+    UPDATE orders SET status = 'cancelled' WHERE id = :id AND status = :当前状态
+    只有更新到一行的请求继续归还库存，并发的取消不会重复归还。库存用 stock + 数量 的形式更新，
+    不会覆盖并发下单对同一商品的扣减。调用方提交事务后应失效返回分类的页面缓存。
+    """
+    previous = order.status
+    if previous not in statuses:
+        return None
+    result = db.session.execute(
+        db.update(Order)
+        .where(Order.id == order.id, Order.status == previous)
+        .values(status='cancelled', updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return None
+
+    rows = db.session.query(OrderItem.product_id, Product.category_id, db.func.sum(OrderItem.quantity))\
+        .join(Product, Product.id == OrderItem.product_id)\
+        .filter(OrderItem.order_id == order.id)\
+        .group_by(OrderItem.product_id, Product.category_id)\
+        .all()
+    quantities = {product_id: int(quantity) for product_id, _, quantity in rows}
+    if quantities:
+        quantity = db.case(quantities, value=Product.id)
+        db.session.execute(
+            db.update(Product)
+            .where(Product.id.in_(quantities))
+            .values(stock=Product.stock + quantity,
+                    sales_count=Product.sales_count - quantity,
+                    updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+    # 销售汇总从原状态移到已取消；状态已由上面的 UPDATE 写入，丢弃对象上的修改避免再写一次
+    change_order_status(order, 'cancelled')
+    db.session.expire(order, ['status', 'updated_at'])
+    return {category_id for _, category_id, _ in rows}
+
+
+def release_expired_holds(batch_size=500):
+    """分批释放过期的锁定，每批一个事务，返回释放的锁定数"""
+    released = 0
+    while True:
+        ids = [row[0] for row in db.session.query(InventoryHold.id)
+               .filter(InventoryHold.expires_at < datetime.utcnow(),
+                       InventoryHold.claim_token.is_(None))
+               .order_by(InventoryHold.expires_at)
+               .limit(batch_size)]
+        if not ids:
+            return released
+        token, held = _claim(InventoryHold.id.in_(ids))
+        count = db.session.query(InventoryHold).filter(InventoryHold.claim_token == token).count()
+        _release(token, held)
+        db.session.commit()
+        released += count
@@ -0,0 +1,239 @@
+"""邮件发送队列
+
+send_email 只把邮件写入磁盘上的发送队列目录（默认 instance/mail_spool），由固定数量的
+后台线程批量发送：每个线程一次认领多封到期的邮件，用同一个 SMTP 连接依次发送。
+发送失败的邮件按指数退避重新排队，超过最大次数后移入 failed/ 目录。
+
+队列目录结构：
+- new/     等待发送，文件名以到期时间开头，按文件名排序即按到期先后排序
+- work/    已被某个线程认领（通过 rename 认领，多进程之间不会重复发送）
+- failed/  多次发送失败的邮件，需人工处理
+
+邮件在磁盘上排队，进程重启后继续发送；进程在发送中途退出时，work/ 中超过
+MAIL_CLAIM_TIMEOUT 的邮件会被放回 new/（因此极少数情况下可能重复发送）。
+内存中只有一个有界的通知队列用于唤醒线程，队列满时邮件仍会被定时扫描发出。
+
+本地调试可用任意 SMTP 替身，例如：
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=False flask --app run mail-flush
+"""
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+
+from flask_mail import Message
+
+from app import mail
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    def __init__(self):
+        self.app = None
+        self.spool_dir = None
+        self.workers = 2
+        self.batch_size = 50
+        self.poll_interval = 5.0
+        self.max_attempts = 5
+        self.retry_base = 30
+        self.retry_max = 3600
+        self.claim_timeout = 600
+        self._pid = None
+        self._wakeup = None
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config.get('MAIL_SPOOL_DIR') or os.path.join(app.instance_path, 'mail_spool')
+        self.workers = app.config.get('MAIL_WORKERS', 2)
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', 50)
+        self.poll_interval = app.config.get('MAIL_POLL_INTERVAL', 5.0)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', 5)
+        self.retry_base = app.config.get('MAIL_RETRY_BASE', 30)
+        self.retry_max = app.config.get('MAIL_RETRY_MAX', 3600)
+        self.claim_timeout = app.config.get('MAIL_CLAIM_TIMEOUT', 600)
+        for name in ('new', 'work', 'failed'):
+            os.makedirs(os.path.join(self.spool_dir, name), exist_ok=True)
+        app.extensions['mail_queue'] = self
+
+    def _path(self, state, name=''):
+        return os.path.join(self.spool_dir, state, name)
+
+    def _write(self, state, payload, due):
+        """原子写入队列文件，返回文件名"""
+        name = f'{int(due * 1000):013d}-{uuid.uuid4().hex}.json'
+        tmp = self._path('work', f'.{name}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(state, name))
+        return name
+
+    def enqueue(self, subject, recipients, body=None, html=None, sender=None):
+        """写入发送队列并唤醒发送线程"""
+        self._write('new', {
+            'subject': subject,
+            'recipients': list(recipients),
+            'body': body,
+            'html': html,
+            'sender': sender,
+            'attempts': 0,
+        }, time.time())
+        if self.workers > 0:
+            self._ensure_started()
+            try:
+                self._wakeup.put_nowait(True)
+            except queue.Full:
+                pass  # 线程都在忙，会在下一轮扫描时发出
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # fork 后子进程需要自己的线程
+            self._wakeup = queue.Queue(maxsize=self.workers * 2)
+            self._threads = [threading.Thread(target=self._run, name=f'mail-sender-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                self._wakeup.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self.requeue_stale()
+            try:
+                while self.process_batch():
+                    pass
+            except Exception:
+                logger.exception('发送邮件队列失败')
+
+    def _claim(self, limit):
+        """认领最多 limit 封到期的邮件，返回 work/ 中的文件名列表"""
+        now_ms = int(time.time() * 1000)
+        claimed = []
+        try:
+            names = sorted(os.listdir(self._path('new')))
+        except OSError:
+            return claimed
+        for name in names:
+            if len(claimed) >= limit:
+                break
+            if not name.endswith('.json'):
+                continue
+            if int(name.split('-', 1)[0]) > now_ms:
+                break  # 之后的邮件都未到期
+            try:
+                os.rename(self._path('new', name), self._path('work', name))
+            except FileNotFoundError:
+                continue  # 已被其他线程或进程认领
+            # 以认领时间作为 mtime，供 requeue_stale 判断是否超时
+            os.utime(self._path('work', name))
+            claimed.append(name)
+        return claimed
+
+    def _retry(self, name, payload, error):
+        payload['attempts'] += 1
+        payload['last_error'] = str(error)
+        if payload['attempts'] >= self.max_attempts:
+            logger.error('邮件多次发送失败，移入 failed：%s %s', payload['recipients'], error)
+            self._write('failed', payload, time.time())
+        else:
+            delay = min(self.retry_base * 2 ** (payload['attempts'] - 1), self.retry_max)
+            self._write('new', payload, time.time() + delay)
+        os.remove(self._path('work', name))
+
+    def process_batch(self):
+        """认领并发送一批邮件，返回处理的数量"""
+        claimed = self._claim(self.batch_size)
+        if not claimed:
+            return 0
+
+        messages = []
+        for name in claimed:
+            try:
+                with open(self._path('work', name), encoding='utf-8') as f:
+                    messages.append((name, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error('无法读取队列文件 %s：%s', name, e)
+                os.replace(self._path('work', name), self._path('failed', name))
+
+        with self.app.app_context():
+            sender = self.app.config.get('MAIL_DEFAULT_SENDER')
+            pending = list(messages)
+            try:
+                # 一个 SMTP 会话发送整批邮件
+                with mail.connect() as connection:
+                    while pending:
+                        name, payload = pending[0]
+                        msg = Message(subject=payload['subject'],
+                                      recipients=payload['recipients'],
+                                      body=payload['body'],
+                                      html=payload['html'],
+                                      sender=payload['sender'] or sender)
+                        try:
+                            connection.send(msg)
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                                smtplib.SMTPDataError) as e:
+                            # 单封邮件被拒（如收件人无效）不影响同批其他邮件
+                            logger.warning('邮件发送失败：%s %s', payload['recipients'], e)
+                            self._retry(name, payload, e)
+                        else:
+                            os.remove(self._path('work', name))
+                        pending.pop(0)
+            except Exception as e:
+                # 连接失败或连接中断，本批剩余邮件全部稍后重试
+                logger.warning('SMTP 连接失败：%s', e)
+                for name, payload in pending:
+                    self._retry(name, payload, e)
+        return len(claimed)
+
+    def requeue_stale(self):
+        """把认领后长时间未完成（进程中途退出）的邮件放回 new/"""
+        deadline = time.time() - self.claim_timeout
+        try:
+            entries = list(os.scandir(self._path('work')))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.name.endswith('.json') or entry.name.startswith('.'):
+                continue
+            try:
+                if entry.stat().st_mtime < deadline:
+                    os.rename(entry.path, self._path('new', entry.name))
+            except OSError:
+                pass
+
+    def flush(self):
+        """在当前线程发送所有到期的邮件，返回处理的数量"""
+        self.requeue_stale()
+        total = 0
+        while True:
+            count = self.process_batch()
+            if not count:
+                return total
+            total += count
+
+    def stats(self):
+        counts = {}
+        for state in ('new', 'work', 'failed'):
+            try:
+                counts[state] = sum(1 for name in os.listdir(self._path(state)) if name.endswith('.json'))
+            except OSError:
+                counts[state] = 0
+        return counts
+
+
+mail_queue = MailQueue()
@@ -1,17 +1,37 @@
-from flask import render_template, request, flash, jsonify
+import hashlib
+from flask import render_template, request, flash, redirect, url_for, Response
 from flask_login import current_user, login_required
 from app import db
-from app.models import Product, Category, UserLog
+from app.models import Product, Category
 from app.main import main
-from sqlalchemy import or_
+from app.category_cache import get_categories
+from app.fastjson import dumps
+from app.page_cache import cached_page
+from app.pagination import keyset_paginate
+from app.search import search_products
+from app.db_routing import read_only
+from app.user_log import log_action
+
+# 首页排序方式对应的游标分页键（最后一列为主键，保证顺序唯一）
+PRODUCT_SORTS = {
+    'newest': [(Product.created_at, True), (Product.id, True)],
+    'price_low': [(Product.price, False), (Product.id, False)],
+    'price_high': [(Product.price, True), (Product.id, True)],
+    'popular': [(Product.sales_count, True), (Product.id, True)],  # 销量字段走索引
+}
+
 
 @main.route('/')
 @main.route('/index')
+@cached_page(lambda: ['categories', f"category:{request.args.get('category_id', type=int) or 'all'}"])
+@read_only()
 def index():
     """首页"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     category_id = request.args.get('category_id', type=int)
     sort_by = request.args.get('sort', 'newest')
+    if sort_by not in PRODUCT_SORTS:
+        sort_by = 'newest'
     
     # 构建查询
     query = Product.query
@@ -20,39 +40,16 @@ def index():
     if category_id:
         query = query.filter_by(category_id=category_id)
     
-    # 排序
-    if sort_by == 'price_low':
-        query = query.order_by(Product.price.asc())
-    elif sort_by == 'price_high':
-        query = query.order_by(Product.price.desc())
-    elif sort_by == 'popular':
-        # 按销量排序（需要关联订单项统计）
-        from sqlalchemy import func
-        from app.models import OrderItem
-        
-        query = query.outerjoin(OrderItem)\
-            .group_by(Product.id)\
-            .order_by(func.sum(OrderItem.quantity).desc())
-    else:  # newest
-        query = query.order_by(Product.created_at.desc())
-    
-    # 分页
+    # 游标分页（排序由分页键决定）
     per_page = 12
-    products = query.paginate(page=page, per_page=per_page, error_out=False)
+    products = keyset_paginate(query, PRODUCT_SORTS[sort_by], cursor=cursor, per_page=per_page)
     
     # 获取所有分类
-    categories = Category.query.all()
+    categories = get_categories()
     
-    # 记录用户浏览日志
+    # 记录用户浏览日志（异步批量写入）
     if current_user.is_authenticated:
-        log = UserLog(
-            user_id=current_user.id,
-            action='view_homepage',
-            ip_address=request.remote_addr,
-            details=f'浏览首页，分类: {category_id or "全部"}'
-        )
-        db.session.add(log)
-        db.session.commit()
+        log_action('view_homepage', f'浏览首页，分类: {category_id or "全部"}')
     
     return render_template('index.html', 
                          products=products, 
@@ -63,6 +60,8 @@ def index():
 
 
 @main.route('/search')
+@cached_page(lambda: ['categories', 'search'])
+@read_only()
 def search():
     """搜索页面"""
     keyword = request.args.get('q', '').strip()
@@ -73,34 +72,16 @@ def search():
         flash('请输入搜索关键词', 'warning')
         return redirect(url_for('main.index'))
     
-    # 构建搜索查询
-    query = Product.query.filter(
-        or_(
-            Product.name.contains(keyword),
-            Product.description.contains(keyword)
-        )
-    )
-    
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    # 分页
+    # 全文搜索，按相关度排序
     per_page = 12
-    products = query.paginate(page=page, per_page=per_page, error_out=False)
+    products = search_products(keyword, category_id=category_id, page=page, per_page=per_page)
     
     # 获取所有分类
-    categories = Category.query.all()
+    categories = get_categories()
     
-    # 记录搜索日志
+    # 记录搜索日志（异步批量写入）
     if current_user.is_authenticated:
-        log = UserLog(
-            user_id=current_user.id,
-            action='search',
-            details=f'搜索关键词: {keyword}',
-            ip_address=request.remote_addr
-        )
-        db.session.add(log)
-        db.session.commit()
+        log_action('search', f'搜索关键词: {keyword}')
     
     return render_template('search.html', 
                          products=products, 
@@ -119,30 +100,66 @@ def contact():
     return render_template('contact.html')
 
 @main.route('/api/products')
+@read_only()
 def api_products():
-    """商品API（用于AJAX加载）"""
-    page = request.args.get('page', 1, type=int)
+    """商品API（用于AJAX加载）
+
+    只查询需要的列并一次关联出分类名称；返回 ETag / Last-Modified，
+    客户端带校验值重新请求且数据未变化时返回 304。
+    """
+    cursor = request.args.get('cursor')
     category_id = request.args.get('category_id', type=int)
     
-    query = Product.query
+    # 最后修改时间：商品表的最大更新时间（走 updated_at 索引）
+    last_modified = db.session.query(db.func.max(Product.updated_at))
+    query = db.session.query(
+        Product.id,
+        Product.name,
+        Product.price,
+        Product.image,
+        Product.stock,
+        Product.created_at,
+        Category.name.label('category')
+    ).outerjoin(Category, Category.id == Product.category_id)
     if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    products = query.order_by(Product.created_at.desc())\
-        .paginate(page=page, per_page=12, error_out=False)
-    
-    # 转换为字典列表
-    products_data = [{
-        'id': p.id,
-        'name': p.name,
-        'price': p.price,
-        'image': p.image,
-        'category': p.category.name if p.category else '',
-        'stock': p.stock
-    } for p in products.items]
-    
-    return jsonify({
-        'products': products_data,
-        'has_next': products.has_next,
-        'next_num': products.next_num
-    })
+        last_modified = last_modified.filter(Product.category_id == category_id)
+        query = query.filter(Product.category_id == category_id)
+    last_modified = last_modified.scalar()
+    
+    products = keyset_paginate(query, PRODUCT_SORTS['newest'], cursor=cursor, per_page=12)
+    
+    # 游标分页的每一页由游标唯一确定，ETag 只需覆盖最后修改时间和本页商品ID
+    # （本页商品被删除时ID列表随之变化）
+    validator = f'{last_modified.isoformat() if last_modified else ""}|{cursor or ""}|{category_id or ""}|' \
+                + ','.join(str(p.id) for p in products.items)
+    etag = hashlib.md5(validator.encode()).hexdigest()
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None))
+    
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(dumps({
+            'products': [{
+                'id': p.id,
+                'name': p.name,
+                'price': p.price,
+                'image': p.image,
+                'category': p.category or '',
+                'stock': p.stock
+            } for p in products.items],
+            'has_next': products.has_next,
+            'has_prev': products.has_prev,
+            'next_cursor': products.next_cursor,
+            'prev_cursor': products.prev_cursor
+        }), mimetype='application/json')
+    
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
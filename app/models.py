@@ -1,8 +1,6 @@
 from app import db, login_manager
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-import random
 
 
 class User(UserMixin, db.Model):
@@ -26,14 +24,25 @@ class User(UserMixin, db.Model):
     reviews = db.relationship('Review', backref='user', lazy='dynamic')
     logs = db.relationship('UserLog', backref='user', lazy='dynamic')
 
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),  # 游标分页
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from app.passwords import password_hasher
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        from app.passwords import password_hasher
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """密码哈希参数是否与当前配置不同"""
+        from app.passwords import password_hasher
+        return password_hasher.needs_rehash(self.password_hash)
 
 
 class Category(db.Model):
@@ -59,9 +68,11 @@ class Product(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, default=0)
+    reserved = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # 结算中被锁定的库存
+    sales_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # 已售数量（不含已取消订单）
     image = db.Column(db.String(200), default='default_product.png')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # 外键
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
@@ -71,15 +82,61 @@ class Product(db.Model):
     order_items = db.relationship('OrderItem', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref='product', lazy='dynamic', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # 热销排序：全部商品 / 按分类
+        db.Index('ix_products_sales_count_id', 'sales_count', 'id'),
+        db.Index('ix_products_category_sales_count', 'category_id', 'sales_count', 'id'),
+        # 游标分页：最新 / 价格排序
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        db.Index('ix_products_category_created_at', 'category_id', 'created_at', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+        # 商品API的最后修改时间（按分类）
+        db.Index('ix_products_category_updated_at', 'category_id', 'updated_at'),
+    )
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
+    @property
+    def available_stock(self):
+        """可售库存（扣除结算中锁定的部分）"""
+        return (self.stock or 0) - (self.reserved or 0)
+
+    @staticmethod
+    def rebuild_sales_count():
+        """根据已有订单项重建销量（已取消订单不计入）"""
+        total = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0))\
+            .join(Order, Order.id == OrderItem.order_id)\
+            .filter(OrderItem.product_id == Product.id)\
+            .filter(Order.status != 'cancelled')\
+            .scalar_subquery()
+        result = db.session.execute(db.update(Product).values(sales_count=total))
+        db.session.commit()
+        return result.rowcount
+
+
+class InventoryHold(db.Model):
+    """结算时的库存锁定，过期后由清理任务释放"""
+    __tablename__ = 'inventory_holds'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    # 下单或清理任务处理锁定前先写入自己的令牌，保证每条锁定只被处理一次
+    claim_token = db.Column(db.String(32), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 
 class Cart(db.Model):
     __tablename__ = 'cart'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # 汇总字段，由购物车增删改和结算维护，避免每次渲染遍历购物车项
+    item_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    total_amount = db.Column(db.Numeric(10, 2), default=0, nullable=False, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -88,11 +145,33 @@ class Cart(db.Model):
 
     @property
     def total_price(self):
-        return sum(item.subtotal for item in self.items)
+        return self.total_amount
 
     @property
     def total_quantity(self):
-        return sum(item.quantity for item in self.items)
+        return self.item_count
+
+    def adjust_totals(self, quantity, amount):
+        """按增量更新汇总（SQL 表达式自增，避免并发丢失更新）"""
+        self.item_count = Cart.item_count + quantity
+        self.total_amount = Cart.total_amount + amount
+
+    def reset_totals(self):
+        self.item_count = 0
+        self.total_amount = 0
+
+    @staticmethod
+    def rebuild_totals():
+        """根据购物车项重建所有购物车的汇总"""
+        item_count = db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0))\
+            .filter(CartItem.cart_id == Cart.id)\
+            .scalar_subquery()
+        total_amount = db.session.query(db.func.coalesce(db.func.sum(CartItem.price * CartItem.quantity), 0))\
+            .filter(CartItem.cart_id == Cart.id)\
+            .scalar_subquery()
+        result = db.session.execute(db.update(Cart).values(item_count=item_count, total_amount=total_amount))
+        db.session.commit()
+        return result.rowcount
 
 
 class CartItem(db.Model):
@@ -128,24 +207,48 @@ class Order(db.Model):
     # 关系
     items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # 游标分页：全部订单 / 按状态
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_orders_user_created_at', 'user_id', 'created_at'),  # 用户的订单列表
+    )
+
     @staticmethod
     def generate_order_number():
         """生成订单号"""
-        import time
-        return f"ORD{int(time.time())}{str(random.randint(1000, 9999))}"
+        from app.snowflake import generate_order_number
+        return generate_order_number()
 
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
 
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # SQLite 不会为外键自动建索引，重建销量、订单详情都按这两列查找
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     subtotal = db.Column(db.Numeric(10, 2), nullable=False)
 
 
+class SalesRollup(db.Model):
+    """按天、订单状态、分类预聚合的销售数据（category_id 为 0 表示全部分类）
+
+    由 app.sales_rollup 在下单、取消、删除订单时增量维护，
+    可用 flask rebuild-sales-rollups 从订单表重建。
+    """
+    __tablename__ = 'sales_rollups'
+
+    day = db.Column(db.Date, primary_key=True)  # 订单创建日期（UTC）
+    status = db.Column(db.String(20), primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+
 class Review(db.Model):
     __tablename__ = 'reviews'
 
@@ -171,10 +274,20 @@ class UserLog(db.Model):
     user_agent = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 游标分页：全部日志 / 按用户
+        db.Index('ix_user_logs_created_at_id', 'created_at', 'id'),
+        db.Index('ix_user_logs_user_created_at', 'user_id', 'created_at', 'id'),
+        # 旧日志会移出该表（见 app.user_log_buckets），SQLite 下 ID 不能因表变空而重新从 1 开始
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f'<UserLog {self.id}>'
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    # 从身份缓存加载，命中时不查询数据库
+    from app.user_cache import load_cached_user
+    return load_cached_user(user_id)
\ No newline at end of file
@@ -2,10 +2,11 @@ from flask import render_template, redirect, url_for, flash, request, url_for
 from flask_login import login_required, current_user
 from app import db
 from app.models import Cart, CartItem, Order, OrderItem, Product
-import random
-import time  # 添加这行
 from datetime import datetime
 from app.order import order
+from app.page_cache import invalidate_products
+from app.inventory import place_holds, claim_user_holds, consume_holds, cancel_and_restock
+from app.sales_rollup import record_order
 
 
 @order.route('/checkout', methods=['GET', 'POST'])
@@ -18,22 +19,36 @@ def checkout():
         flash('购物车为空', 'error')
         return redirect(url_for('cart.view_cart'))
 
+    # 一次查询取出购物车项及对应商品
+    lines = db.session.query(CartItem, Product)\
+        .join(Product, Product.id == CartItem.product_id)\
+        .filter(CartItem.cart_id == cart.id)\
+        .order_by(CartItem.id)\
+        .all()
+
     if request.method == 'POST':
-        # 验证库存
-        for item in cart.items:
-            if item.product.stock < item.quantity:
-                flash(f'{item.product.name} 库存不足，仅剩 {item.product.stock} 件', 'error')
+        # 认领本用户在结算页锁定的库存，其他用户的锁定不可占用
+        token, held = claim_user_holds(current_user.id)
+
+        # 单次遍历：验证可售库存、计算总额、汇总各商品的购买数量
+        total_amount = 0
+        quantities = {}
+        category_ids = set()
+        for item, product in lines:
+            quantities[product.id] = quantities.get(product.id, 0) + item.quantity
+            category_ids.add(product.category_id)
+            available = product.available_stock + held.get(product.id, 0)
+            if available < quantities[product.id]:
+                db.session.rollback()
+                flash(f'{product.name} 库存不足，仅剩 {max(available, 0)} 件', 'error')
                 return redirect(url_for('cart.view_cart'))
-
-        # 生成订单号
-        def generate_order_number():
-            return f"ORD{int(time.time())}{random.randint(1000, 9999)}"
+            total_amount += item.subtotal
 
         # 创建订单
         order = Order(
-            order_number=generate_order_number(),
+            order_number=Order.generate_order_number(),
             user_id=current_user.id,
-            total_amount=cart.total_price,
+            total_amount=total_amount,
             shipping_address=request.form.get('shipping_address', ''),
             payment_method=request.form.get('payment_method', 'credit_card'),
             notes=request.form.get('notes', '')
@@ -41,29 +56,50 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # 获取order.id但不提交
 
-        # 创建订单项并减少库存
-        for cart_item in cart.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.price,
-                subtotal=cart_item.subtotal
-            )
-            db.session.add(order_item)
-
-            # 减少库存
-            cart_item.product.stock -= cart_item.quantity
+        # 批量插入订单项
+        db.session.execute(db.insert(OrderItem), [{
+            'order_id': order.id,
+            'product_id': item.product_id,
+            'quantity': item.quantity,
+            'price': item.price,
+            'subtotal': item.subtotal
+        } for item, _ in lines])
+
+        # 一条条件 UPDATE 按锁定扣减所有商品的库存并累加销量；
+        # 锁定已被释放且可售库存不足时更新行数会少于商品数，整单回滚
+        if not consume_holds(token, held, quantities):
+            db.session.rollback()
+            flash('部分商品库存不足，请重新确认购物车', 'error')
+            return redirect(url_for('cart.view_cart'))
+
+        # 计入销售汇总
+        record_order(order, [(product.category_id, item.quantity, item.subtotal) for item, product in lines])
 
         # 清空购物车
         cart.items.delete()
+        cart.reset_totals()
 
         db.session.commit()
+
+        # 批量 UPDATE 绕过了 ORM 事件，手动失效商品页面缓存
+        invalidate_products(category_ids)
+
         flash(f'订单创建成功！订单号：{order.order_number}', 'success')
         return redirect(url_for('order.order_detail', order_id=order.id))
 
+    # 打开结算页时锁定库存，锁定期间其他用户无法买走这些库存
+    quantities = {}
+    for item, product in lines:
+        quantities[product.id] = quantities.get(product.id, 0) + item.quantity
+    failed = place_holds(current_user.id, quantities)
+    db.session.commit()
+    for item, product in lines:
+        if product.id in failed:
+            flash(f'{product.name} 库存紧张，提交订单时可能无法购买', 'warning')
+            failed.discard(product.id)
+
     # 修改为：直接使用模板名，因为模板在 app/order/templates/checkout.html
-    return render_template('checkout.html', cart=cart, now=datetime.now())
+    return render_template('checkout.html', cart=cart, items=[item for item, _ in lines], now=datetime.now())
 
 
 @order.route('/<int:order_id>')
@@ -99,19 +135,15 @@ def cancel_order(order_id):
         flash('无权操作', 'error')
         return redirect(url_for('order.order_list'))
 
-    # 只有待处理订单可以取消
-    if order.status != 'pending':
+    # 只有待处理订单可以取消（按状态条件更新，并发的取消只有一个生效）
+    category_ids = cancel_and_restock(order)
+    if category_ids is None:
+        db.session.rollback()
         flash('只有待处理订单可以取消', 'error')
         return redirect(url_for('order.order_detail', order_id=order_id))
 
-    # 恢复库存
-    for item in order.items:
-        product = Product.query.get(item.product_id)
-        if product:
-            product.stock += item.quantity
-
-    order.status = 'cancelled'
     db.session.commit()
+    invalidate_products(category_ids)
     flash('订单已取消', 'success')
     return redirect(url_for('order.order_detail', order_id=order_id))
 
@@ -0,0 +1,33 @@
+"""后台订单导出
+
+每个订单项一行，附带订单和商品信息（没有订单项的订单也输出一行）。订单、订单项、商品、用户
+在数据库中联接，按 (created_at, id) 顺序用 yield_per 分批读取（MySQL 下为服务端游标），
+状态和时间范围的筛选落在 ix_orders_status_created_at / ix_orders_created_at_id 索引上。
+"""
+from app import db
+from app.models import Order, OrderItem, Product, User
+
+EXPORT_COLUMNS = ['order_id', 'order_number', 'created_at', 'status', 'user_id', 'username',
+                  'total_amount', 'payment_method', 'shipping_address',
+                  'product_id', 'product_name', 'quantity', 'price', 'subtotal']
+
+
+def export_rows(status=None, start=None, end=None):
+    """逐行返回导出的订单项字典；start / end 为 UTC 时间，含 start 不含 end"""
+    query = db.session.query(
+        Order.id.label('order_id'), Order.order_number, Order.created_at, Order.status,
+        Order.user_id, User.username, Order.total_amount, Order.payment_method, Order.shipping_address,
+        OrderItem.product_id, Product.name.label('product_name'),
+        OrderItem.quantity, OrderItem.price, OrderItem.subtotal
+    ).outerjoin(OrderItem, OrderItem.order_id == Order.id
+    ).outerjoin(Product, Product.id == OrderItem.product_id
+    ).outerjoin(User, User.id == Order.user_id)
+    if status:
+        query = query.filter(Order.status == status)
+    if start:
+        query = query.filter(Order.created_at >= start)
+    if end:
+        query = query.filter(Order.created_at < end)
+    query = query.order_by(Order.created_at, Order.id, OrderItem.id)
+    for row in query.yield_per(1000):
+        yield row._asdict()
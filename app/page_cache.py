@@ -0,0 +1,280 @@
+"""匿名访问页面的响应缓存（按标签失效）
+
+缓存键为路由路径加排序后的查询参数。每个缓存条目记录写入时各标签的版本号，
+读取时任一标签版本变化即视为失效；失效操作只需递增标签版本。
+
+标签约定：
+- category:all / category:<id>  首页按分类的商品列表
+- search                        搜索结果
+- categories                    页面中的分类列表
+
+后端：
+- memory: 进程内 LRU，适合单进程开发环境
+- file:   共享目录（默认 instance/page_cache），多个 gunicorn worker 共用
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, request, session, Response
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class MemoryBackend:
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tag_versions(self, tags):
+        return {tag: self._tags.get(tag, 0) for tag in tags}
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class FileBackend:
+    """基于共享目录的缓存，多进程可见
+
+    条目保存为 entries/<键的哈希>，标签版本保存为 tags/<标签的哈希> 文件，
+    版本号取文件的 (inode, mtime)，失效时原子替换标签文件即可。
+    """
+
+    def __init__(self, directory, max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries_dir = os.path.join(directory, 'entries')
+        self.tags_dir = os.path.join(directory, 'tags')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.tags_dir, exist_ok=True)
+        self._writes = 0
+
+    @staticmethod
+    def _hash(value):
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, self._hash(key))
+
+    def _replace(self, path, data):
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def set(self, key, entry):
+        self._replace(self._entry_path(key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        """条目过多时删除最早写入的文件"""
+        try:
+            names = [e for e in os.scandir(self.entries_dir) if not e.name.endswith('.tmp')]
+        except OSError:
+            return
+        if len(names) <= self.max_entries:
+            return
+        names.sort(key=lambda e: e.stat().st_mtime)
+        for entry in names[:len(names) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def tag_versions(self, tags):
+        versions = {}
+        for tag in tags:
+            try:
+                st = os.stat(os.path.join(self.tags_dir, self._hash(tag)))
+                versions[tag] = (st.st_ino, st.st_mtime_ns)
+            except OSError:
+                versions[tag] = None
+        return versions
+
+    def bump_tags(self, tags):
+        for tag in tags:
+            self._replace(os.path.join(self.tags_dir, self._hash(tag)), str(time.time_ns()).encode())
+
+    def clear(self):
+        for directory in (self.entries_dir, self.tags_dir):
+            for entry in os.scandir(directory):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+class PageCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+
+    def init_app(self, app):
+        name = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 1000)
+        if name == 'file':
+            directory = app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache')
+            self.backend = FileBackend(directory, max_entries)
+        elif name == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        else:
+            self.backend = None
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        app.extensions['page_cache'] = self
+
+    def get(self, key):
+        """返回未失效的缓存条目，否则返回 None"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['created_at'] > self.ttl \
+                or self.backend.tag_versions(entry['tags']) != entry['tags']:
+            self.backend.delete(key)
+            return None
+        return entry
+
+    def set(self, key, body, mimetype, tag_versions):
+        self.backend.set(key, {
+            'body': body,
+            'mimetype': mimetype,
+            'tags': tag_versions,
+            'created_at': time.time(),
+        })
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.bump_tags(tags)
+
+
+page_cache = PageCache()
+
+
+def _cache_key():
+    args = sorted(request.args.items(multi=True))
+    return f'{request.path}?{urlencode(args)}'
+
+
+def _cacheable_request():
+    # 只缓存匿名用户的 GET 请求；有待显示的提示消息时不缓存
+    return (page_cache.backend is not None
+            and request.method == 'GET'
+            and not current_user.is_authenticated
+            and not session.get('_flashes'))
+
+
+def cached_page(tags):
+    """缓存匿名访问的页面
+
+    :param tags: 根据当前请求返回标签列表的函数
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not _cacheable_request():
+                return f(*args, **kwargs)
+
+            key = _cache_key()
+            entry = page_cache.get(key)
+            if entry is not None:
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+                response.headers['X-Page-Cache'] = 'HIT'
+                return response
+
+            # 先取标签版本再渲染，渲染期间发生的失效会让本条目立即过期
+            tag_versions = page_cache.backend.tag_versions(tags())
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                page_cache.set(key, response.get_data(), response.mimetype, tag_versions)
+                response.headers['X-Page-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
+
+
+def product_tags(category_ids):
+    """商品变化时需要失效的标签"""
+    tags = {'category:all', 'search'}
+    tags.update(f'category:{category_id}' for category_id in category_ids if category_id)
+    return tags
+
+
+def invalidate_products(category_ids):
+    """商品（含库存）变化后失效相关页面；用于绕过 ORM 的批量更新"""
+    page_cache.invalidate(*product_tags(category_ids))
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_catalog_changes(session, flush_context):
+    from app.models import Product, Category
+
+    tags = session.info.setdefault('page_cache_tags', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            # 修改分类时新旧分类都要失效
+            category_ids = {obj.category_id}
+            category_ids.update(inspect(obj).attrs.category_id.history.deleted or ())
+            tags.update(product_tags(category_ids))
+        elif isinstance(obj, Category):
+            tags.add('categories')
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags:
+        page_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('page_cache_tags', None)
@@ -0,0 +1,199 @@
+"""游标（keyset）分页
+
+按 (排序键, id) 定位下一页/上一页，不使用 OFFSET，也不需要 COUNT(*)，
+因此任意深的页与第一页的开销相同。游标对客户端是不透明的字符串。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, text
+
+from app import db
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = [direction] + [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """解析游标，返回 (方向, 排序键值列表)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, *values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ('next', 'prev') or len(values) != len(columns):
+        raise InvalidCursor(cursor)
+    decoded = []
+    for (column, _), value in zip(columns, values):
+        try:
+            if value is not None and column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+        except (NotImplementedError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        decoded.append(value)
+    return direction, decoded
+
+
+def _after(columns, values):
+    """构造“排在游标之后”的条件：a > x OR (a = x AND b > y) ...
+
+    展开成 OR 形式而不是行值比较，保证 MySQL 也能走范围索引。
+    """
+    clauses = []
+    for i, ((column, descending), value) in enumerate(zip(columns, values)):
+        equal = [c == v for (c, _), v in zip(columns[:i], values[:i])]
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+class KeysetPagination:
+    """游标分页结果
+
+    :param items: 当前页数据
+    :param next_cursor: 下一页游标，没有下一页时为 None
+    :param prev_cursor: 上一页游标，没有上一页时为 None
+    :param total: 总数（可选，可能是估算值）
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _key(item, columns):
+    return [getattr(item, column.key) for column, _ in columns]
+
+
+def _parse_cursor(cursor, columns):
+    if cursor:
+        try:
+            return decode_cursor(cursor, columns)
+        except InvalidCursor:
+            pass  # 无效游标按第一页处理
+    return 'next', None
+
+
+def _scan(query, columns, values, backwards, limit):
+    """按扫描方向取游标之后的 limit 行（向前翻页时为反向顺序）"""
+    if values is not None:
+        # 向前翻页时，“之前”即反向排序后的“之后”
+        scan = [(column, descending != backwards) for column, descending in columns]
+        query = query.filter(_after(scan, values))
+
+    order_by = []
+    for column, descending in columns:
+        order_by.append(column.asc() if descending == backwards else column.desc())
+    return query.order_by(*order_by).limit(limit).all()
+
+
+def _page(rows, columns, per_page, values, backwards, total):
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = encode_cursor(_key(rows[-1], columns), 'next')
+        if (more and backwards) or (values is not None and not backwards):
+            prev_cursor = encode_cursor(_key(rows[0], columns), 'prev')
+
+    return KeysetPagination(rows, per_page, next_cursor, prev_cursor, total)
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, total=None):
+    """按游标分页
+
+    :param query: 未排序的查询
+    :param columns: [(列, 是否降序), ...]，最后一列应为主键以保证顺序唯一
+    :param cursor: 上一次返回的 next_cursor / prev_cursor
+    :param total: 总数（由调用方决定是否计算或估算）
+    """
+    direction, values = _parse_cursor(cursor, columns)
+    backwards = direction == 'prev'
+    rows = _scan(query, columns, values, backwards, per_page + 1)
+    return _page(rows, columns, per_page, values, backwards, total)
+
+
+def keyset_paginate_buckets(buckets, cursor=None, per_page=20, total=None):
+    """按游标分页，数据按时间分布在多个桶（表）中
+
+    :param buckets: [(下界, 上界, 未排序的查询, 列), ...]；各桶的列同 keyset_paginate，
+                    名称一致且都按降序排列，第一列为时间，取值在 [下界, 上界) 内（None 表示无界）
+
+    只查询与游标位置相关的桶；凑够一页后，范围不可能排在这一页中的桶不再查询。
+    各桶的时间范围可以重叠，结果按排序键归并。
+    """
+    if not buckets:
+        return KeysetPagination([], per_page, total=total)
+    columns = buckets[0][3]
+    direction, values = _parse_cursor(cursor, columns)
+    backwards = direction == 'prev'
+    limit = per_page + 1
+
+    # 向后翻页按上界从新到旧扫描各桶，向前翻页按下界从旧到新
+    if backwards:
+        ordered = sorted(buckets, key=lambda b: (b[0] is not None, b[0] or datetime.min))
+    else:
+        ordered = sorted(buckets, key=lambda b: (b[1] is None, b[1] or datetime.min), reverse=True)
+
+    rows = []
+    for lower, upper, query, bucket_columns in ordered:
+        if values is not None:
+            # 整个桶都在游标之前
+            if not backwards and lower is not None and lower > values[0]:
+                continue
+            if backwards and upper is not None and upper <= values[0]:
+                continue
+        if len(rows) >= limit:
+            # 已凑够一页，且之后的桶都排在这一页之后
+            edge = getattr(rows[limit - 1], columns[0][0].key)
+            if not backwards and upper is not None and upper <= edge:
+                break
+            if backwards and lower is not None and lower > edge:
+                break
+        rows += _scan(query, bucket_columns, values, backwards, limit)
+        rows.sort(key=lambda row: _key(row, columns), reverse=not backwards)
+        rows = rows[:limit]
+
+    return _page(rows, columns, per_page, values, backwards, total)
+
+
+def approximate_count(model):
+    """估算整表行数，避免在大表上执行 COUNT(*)
+
+    MySQL 读取 information_schema 的统计值；SQLite 用最大自增ID近似（走主键，常数时间）。
+    """
+    table = model.__tablename__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        return db.session.execute(text(
+            'SELECT TABLE_ROWS FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = :table'
+        ), {'table': table}).scalar() or 0
+    return db.session.query(db.func.max(model.id)).scalar() or 0
@@ -0,0 +1,138 @@
+"""密码哈希服务
+
+密码哈希（默认 scrypt）刻意消耗大量 CPU。集中登录或注册时，如果每个 gunicorn
+worker 都在自己的进程里计算，所有 CPU 都会被占满，商品页等普通请求随之变慢。
+
+这里把哈希计算放到进程池中执行，并用一组文件锁槽位限制整台机器上同时进行的哈希
+计算数（PASSWORD_HASH_CONCURRENCY）。等待槽位超过 PASSWORD_HASH_WAIT 秒时抛出
+PasswordHasherBusy，由视图返回“系统繁忙”，而不是让请求无限排队。
+
+哈希参数由 PASSWORD_HASH_METHOD 配置；参数变化后，用户下次登录成功时自动用新参数
+重新计算哈希（见 needs_rehash）。
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:  # 非 Unix 平台只在进程内限制并发
+    fcntl = None
+
+
+class PasswordHasherBusy(Exception):
+    """哈希计算的并发数已满"""
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.pool_size = 0
+        self.concurrency = 2
+        self.wait = 0.2
+        self.slot_dir = None
+        self._pid = None
+        self._executor = None
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._start_lock = threading.Lock()
+        self._method_prefix = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', 16)
+        self.pool_size = app.config.get('PASSWORD_HASH_POOL_SIZE', 0)
+        self.concurrency = app.config.get('PASSWORD_HASH_CONCURRENCY', 2)
+        self.wait = app.config.get('PASSWORD_HASH_WAIT', 0.2)
+        self.slot_dir = app.config.get('PASSWORD_HASH_SLOT_DIR') \
+            or os.path.join(app.instance_path, 'password_hash_slots')
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._method_prefix = None
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        if self.pool_size <= 0:
+            return None
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    # fork 出的 worker 不能使用父进程的进程池；子进程用 spawn 启动，
+                    # 不继承 worker 中的线程和数据库连接
+                    self._executor = ProcessPoolExecutor(max_workers=self.pool_size,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _acquire_slot(self):
+        """占用一个全机范围的哈希槽位，返回需要释放的文件；超时抛出 PasswordHasherBusy"""
+        deadline = time.monotonic() + self.wait
+        # 先限制本进程内的并发，避免同一进程的多个线程反复争抢文件锁
+        if not self._semaphore.acquire(timeout=self.wait):
+            raise PasswordHasherBusy()
+        if fcntl is None:
+            return None
+        try:
+            os.makedirs(self.slot_dir, exist_ok=True)
+            while True:
+                for slot in range(self.concurrency):
+                    f = open(os.path.join(self.slot_dir, f'{slot}.lock'), 'w')
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        f.close()
+                        continue
+                    return f
+                if time.monotonic() >= deadline:
+                    raise PasswordHasherBusy()
+                time.sleep(0.01)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def _release_slot(self, f):
+        if f is not None:
+            f.close()  # 关闭文件即释放锁
+        self._semaphore.release()
+
+    def _run(self, func, *args):
+        slot = self._acquire_slot()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return func(*args)
+            return executor.submit(func, *args).result()
+        finally:
+            self._release_slot(slot)
+
+    def hash(self, password):
+        """按当前配置计算密码哈希"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    @property
+    def method_prefix(self):
+        """当前配置实际写入哈希的方法前缀
+
+        PASSWORD_HASH_METHOD 可以省略参数（如 scrypt、pbkdf2:sha256），Werkzeug 会补全为
+        scrypt:32768:8:1 等形式，且默认参数随版本变化；首次使用时计算一次哈希取得前缀。
+        """
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method, self.salt_length).split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        """已保存的哈希是否使用了与当前配置不同的参数（方法、KDF 参数或盐长度）"""
+        parts = password_hash.split('$')
+        if len(parts) != 3:
+            return True
+        method, salt, _ = parts
+        return method != self.method_prefix or len(salt) != self.salt_length
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,245 @@
+"""商品批量导入导出（后台）
+
+导出：按商品ID顺序用 yield_per 分批读取，由 app.exports 边查询边生成 CSV / JSONL，内存占用与商品数无关。
+
+导入：逐行读取上传的 CSV / JSONL 文件并校验，每 PRODUCT_IMPORT_CHUNK_SIZE 行提交一个事务：
+- 带 id 且商品已存在：只更新文件中给出的列（可以只给 id 和 stock 同步库存）；
+- 不带 id，或 id 不存在：新增商品，此时名称、价格、库存、分类都必须给出；
+- 分类可用 category_id 或分类名称 category 指定；
+- 导出文件中的 sales_count、reserved、created_at、updated_at 等只读列会被忽略，
+  导出的文件修改后可以直接导入。
+校验失败的行跳过并记录行号和原因，不影响其他行。
+"""
+import gzip
+import io
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.bulk_load import coerce_value, iter_rows
+from app.models import Category, Product
+
+EXPORT_COLUMNS = ['id', 'name', 'description', 'price', 'stock', 'category_id', 'category',
+                  'image', 'sales_count', 'reserved', 'created_at', 'updated_at']
+EDITABLE_COLUMNS = ['name', 'description', 'price', 'stock', 'category_id', 'image']
+IGNORED_COLUMNS = {'category', 'sales_count', 'reserved', 'created_at', 'updated_at'}
+REQUIRED_FOR_INSERT = ['name', 'price', 'stock', 'category_id']
+MAX_REPORTED_ERRORS = 100
+
+
+# ---------- 导出 ----------
+
+def export_rows(category_id=None):
+    """按ID顺序逐行返回导出的商品字典"""
+    query = db.session.query(
+        *(Product.__table__.c[column] for column in EXPORT_COLUMNS if column != 'category'),
+        Category.name.label('category')
+    ).outerjoin(Category, Category.id == Product.category_id).order_by(Product.id)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    for row in query.yield_per(1000):
+        yield row._asdict()
+
+
+# ---------- 导入 ----------
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # [(行号, 原因)]，只保留前 MAX_REPORTED_ERRORS 条
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+
+def open_upload(file_storage):
+    """把上传的文件包装为文本流，返回 (文本流, 格式)"""
+    filename = (file_storage.filename or '').lower()
+    stream = file_storage.stream
+    if filename.endswith('.gz'):
+        stream = gzip.GzipFile(fileobj=stream)
+        filename = filename[:-3]
+    if filename.endswith('.csv'):
+        fmt = 'csv'
+    elif filename.endswith(('.jsonl', '.ndjson', '.json')):
+        fmt = 'jsonl'
+    else:
+        raise ValueError('只支持 .csv、.jsonl 文件（可以是 .gz 压缩的）')
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''), fmt
+
+
+def validate_row(row, category_ids, category_names):
+    """校验一行，返回只含可写列的字典；数据无效时抛出 ValueError"""
+    columns = Product.__table__.c
+    if None in row:
+        raise ValueError('该行的列数多于表头')
+    unknown = [key for key in row if key not in columns and key not in IGNORED_COLUMNS]
+    if unknown:
+        raise ValueError(f'未知的列：{", ".join(unknown)}')
+
+    values = {}
+    for key in ['id'] + EDITABLE_COLUMNS:
+        value = row.get(key)
+        if value is None or (value == '' and key not in ('description', 'image')):
+            continue
+        try:
+            values[key] = coerce_value(columns[key], value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValueError(f'{key} 的值无效：{value}')
+        if isinstance(columns[key].type, db.String):
+            values[key] = str(values[key])
+    if 'id' in values and values['id'] <= 0:
+        raise ValueError('id 必须是正整数')
+
+    category = row.get('category')
+    if 'category_id' not in values and category:
+        if category not in category_names:
+            raise ValueError(f'分类不存在：{category}')
+        values['category_id'] = category_names[category]
+
+    if 'name' in values:
+        values['name'] = values['name'].strip()
+        if not values['name'] or len(values['name']) > 100:
+            raise ValueError('商品名称不能为空，且不能超过 100 个字符')
+    if 'price' in values and not values['price'] >= 0.01:
+        raise ValueError('价格必须大于 0')
+    if 'stock' in values and values['stock'] < 0:
+        raise ValueError('库存不能为负数')
+    if 'category_id' in values and values['category_id'] not in category_ids:
+        raise ValueError(f'分类ID不存在：{values["category_id"]}')
+    if 'image' in values and len(values['image']) > 200:
+        raise ValueError('图片文件名不能超过 200 个字符')
+    return values
+
+
+def _execute_grouped(statement_for, rows):
+    """按列集合分组执行 executemany（同一批参数的列必须相同）"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for columns, group in groups.items():
+        db.session.execute(statement_for(columns), group)
+
+
+def _update_statement(columns):
+    table = Product.__table__
+    return db.update(table).where(table.c.id == db.bindparam('_id')).values(
+        {column: db.bindparam(column) for column in columns if column != '_id'})
+
+
+def _write_chunk(chunk, result):
+    """写入一批已校验的行并提交"""
+    from app.page_cache import invalidate_products
+    from app.search import get_search_backend
+
+    table = Product.__table__
+    ids = [values['id'] for _, values in chunk if 'id' in values]
+    existing = {}  # 已存在的商品ID -> 原分类ID
+    for start in range(0, len(ids), 500):
+        existing.update(db.session.query(Product.id, Product.category_id)
+                        .filter(Product.id.in_(ids[start:start + 500])))
+
+    updates, inserts = [], []
+    for line, values in chunk:
+        if values.get('id') in existing:
+            if len(values) > 1:
+                updates.append(dict({k: v for k, v in values.items() if k != 'id'}, _id=values['id']))
+            continue
+        missing = [key for key in REQUIRED_FOR_INSERT if key not in values]
+        if missing:
+            result.error(line, f'新增商品缺少：{", ".join(missing)}')
+            continue
+        values.setdefault('description', '')
+        inserts.append(values)
+
+    if not updates and not inserts:
+        return
+    # 只更新给出的列（updated_at 由列的 onupdate 自动更新）
+    if updates:
+        _execute_grouped(_update_statement, updates)
+    max_id = db.session.query(db.func.max(Product.id)).scalar() or 0
+    if inserts:
+        _execute_grouped(lambda columns: db.insert(table), inserts)
+
+    # 批量语句绕过了 ORM 事件：手动更新搜索索引，提交后失效页面缓存
+    changed_ids = [row['_id'] for row in updates] + [row['id'] for row in inserts if 'id' in row]
+    changed = db.session.query(Product.id, Product.name, Product.description, Product.category_id).filter(
+        db.or_(Product.id.in_(changed_ids), Product.id > max_id)
+    ).all()
+    backend = get_search_backend()
+    connection = db.session.connection()
+    for product in changed:
+        backend.index_product(connection, product)
+    db.session.commit()
+    category_ids = {product.category_id for product in changed}
+    category_ids.update(existing[row['_id']] for row in updates)  # 改了分类的商品从原分类页消失
+    invalidate_products(category_ids)
+    result.updated += len(updates)
+    result.inserted += len(inserts)
+
+
+def import_products(rows, chunk_size=1000, first_line=1):
+    """导入商品行，每 chunk_size 行提交一次
+
+    生成器：开始时、每处理 chunk_size 行和结束时产出同一个 ImportResult，调用方可据此报告进度。
+    """
+    category_ids = set()
+    category_names = {}
+    for category_id, name in db.session.query(Category.id, Category.name):
+        category_ids.add(category_id)
+        category_names[name] = category_id
+
+    result = ImportResult()
+    yield result
+    chunk = []
+    for line, row in enumerate(rows, first_line):
+        result.rows += 1
+        try:
+            chunk.append((line, validate_row(row, category_ids, category_names)))
+        except (ValueError, TypeError, ArithmeticError) as e:
+            result.error(line, str(e))
+        if len(chunk) >= chunk_size:
+            _write_chunk_safely(chunk, result)
+            chunk = []
+        if result.rows % chunk_size == 0:
+            yield result
+    if chunk:
+        _write_chunk_safely(chunk, result)
+    yield result
+
+
+def _write_chunk_safely(chunk, result):
+    """整批写入失败（如文件中有重复的新 id）时逐行重试，只跳过出错的行"""
+    error_count, errors = result.error_count, list(result.errors)
+    try:
+        _write_chunk(chunk, result)
+        return
+    except IntegrityError:
+        db.session.rollback()
+        result.error_count, result.errors = error_count, errors
+    for line, values in chunk:
+        try:
+            _write_chunk([(line, values)], result)
+        except IntegrityError as e:
+            db.session.rollback()
+            result.error(line, f'写入失败：{e.orig}')
+
+
+def read_upload(file_storage):
+    """返回 (行迭代器, 第一行数据的行号)"""
+    stream, fmt = open_upload(file_storage)
+    return iter_rows(stream, fmt), 2 if fmt == 'csv' else 1
@@ -0,0 +1,192 @@
+"""请求级 SQL 统计
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件记录每个请求执行的 SQL：
+- 查询次数、数据库总耗时，写入响应的 Server-Timing 头（浏览器开发者工具中可见）；
+- 按语句指纹（去掉参数和 IN 列表长度后的 SQL）统计重复执行次数，同一指纹的 SELECT
+  在一个请求中执行达到 PROFILING_N_PLUS_ONE_THRESHOLD 次时记为疑似 N+1 并写日志；
+- 按端点（endpoint）累计，后台 /admin/perf 按数据库总耗时排序展示。
+
+统计数据保存在各进程内存中，后台页面显示的是处理该请求的 worker 的数据。
+后台线程（如用户日志写入）不在请求中，不计入统计。
+"""
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s|:\w+|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+# 每个端点保留的指纹数
+MAX_FINGERPRINTS = 20
+
+
+def fingerprint(statement):
+    """把 SQL 归一化为指纹：参数和字面量替换为 ?，IN 列表折叠为 (...)"""
+    sql = _STRING_LITERAL.sub('?', statement)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """一个请求内执行的 SQL"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.statements = {}  # 指纹 -> [次数, 耗时]
+
+    def record(self, statement, duration):
+        self.query_count += 1
+        self.db_time += duration
+        entry = self.statements.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def repeated(self, threshold):
+        """疑似 N+1 的 SELECT 指纹：[(指纹, 次数)]"""
+        return [(fp, count) for fp, (count, _) in self.statements.items()
+                if count >= threshold and fp.upper().startswith('SELECT')]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.db_time_max = 0.0
+        self.max_queries = 0
+        self.total_time = 0.0
+        self.n_plus_one = 0
+        self.fingerprints = {}  # 指纹 -> {'count', 'db_time', 'max_per_request', 'n_plus_one'}
+
+    def add(self, profile, elapsed, repeated):
+        self.requests += 1
+        self.queries += profile.query_count
+        self.db_time += profile.db_time
+        self.db_time_max = max(self.db_time_max, profile.db_time)
+        self.max_queries = max(self.max_queries, profile.query_count)
+        self.total_time += elapsed
+        if repeated:
+            self.n_plus_one += 1
+        repeated = dict(repeated)
+        for fp, (count, duration) in profile.statements.items():
+            entry = self.fingerprints.setdefault(fp, {'count': 0, 'db_time': 0.0,
+                                                      'max_per_request': 0, 'n_plus_one': 0})
+            entry['count'] += count
+            entry['db_time'] += duration
+            entry['max_per_request'] = max(entry['max_per_request'], count)
+            if fp in repeated:
+                entry['n_plus_one'] += 1
+        if len(self.fingerprints) > MAX_FINGERPRINTS:
+            # 只保留耗时最多的指纹
+            keep = sorted(self.fingerprints.items(), key=lambda item: item[1]['db_time'], reverse=True)
+            self.fingerprints = dict(keep[:MAX_FINGERPRINTS])
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.n_plus_one_threshold = 5
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.since = time.time()  # 开始统计的时间
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILING_ENABLED', True)
+        self.n_plus_one_threshold = app.config.get('PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        app.extensions['profiler'] = self
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.sql_profile = RequestProfile()
+
+    def _after_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        elapsed = time.perf_counter() - profile.started
+        repeated = profile.repeated(self.n_plus_one_threshold)
+        endpoint = request.endpoint or 'unknown'
+
+        if repeated:
+            for fp, count in repeated:
+                logger.warning('疑似 N+1 查询：%s 在一次请求中执行 %d 次：%s', endpoint, count, fp)
+
+        with self._lock:
+            self._endpoints.setdefault(endpoint, EndpointStats()).add(profile, elapsed, repeated)
+
+        response.headers.add('Server-Timing', f'db;dur={profile.db_time * 1000:.1f};'
+                                              f'desc="{profile.query_count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        return response
+
+    def report(self):
+        """按数据库总耗时降序的端点统计"""
+        with self._lock:
+            rows = []
+            for endpoint, stats in self._endpoints.items():
+                fingerprints = sorted(stats.fingerprints.items(),
+                                      key=lambda item: item[1]['db_time'], reverse=True)
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': stats.requests,
+                    'avg_queries': stats.queries / stats.requests,
+                    'max_queries': stats.max_queries,
+                    'db_time_ms': stats.db_time * 1000,
+                    'avg_db_ms': stats.db_time * 1000 / stats.requests,
+                    'max_db_ms': stats.db_time_max * 1000,
+                    'avg_total_ms': stats.total_time * 1000 / stats.requests,
+                    'n_plus_one': stats.n_plus_one,
+                    'fingerprints': [dict(fingerprint=fp, **data) for fp, data in fingerprints],
+                })
+        rows.sort(key=lambda row: row['db_time_ms'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.since = time.time()
+
+
+profiler = Profiler()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if profiler.enabled and has_request_context() and 'sql_profile' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    profile = g.get('sql_profile') if has_request_context() else None
+    if profile is not None:
+        profile.record(statement, duration)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_statement(exception_context):
+    # 执行出错时不会触发 after_cursor_execute
+    connection = exception_context.connection
+    starts = connection.info.get('query_start') if connection is not None else None
+    if starts:
+        starts.pop()
@@ -0,0 +1,207 @@
+"""销售数据预聚合
+
+sales_rollups 表按 (订单创建日期, 订单状态, 分类) 保存订单数、件数和销售额，
+category_id 为 0 的行是全部分类的合计。下单、修改订单状态、删除订单时在同一事务中
+用 upsert 增量更新对应的几行，仪表板只读取预聚合的数据，与订单总量无关。
+
+分类行的订单数是包含该分类商品的订单数，销售额是该分类商品的小计之和；
+合计行的销售额取订单总额。数据不一致时可用 flask rebuild-sales-rollups 重建。
+"""
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models import Order, OrderItem, Product, SalesRollup
+
+ALL_CATEGORIES = 0
+
+# 计入销售额的订单状态（不含已取消）
+REVENUE_STATUSES = ('pending', 'paid', 'shipped', 'delivered')
+
+COUNTERS = ('order_count', 'quantity', 'revenue')
+
+
+def _rollup_rows(order, status, items, sign):
+    """计算一个订单对各汇总行的增量
+
+    :param items: [(分类ID, 数量, 小计)]，同一分类可出现多次
+    :param sign: 1 表示计入，-1 表示扣除
+    """
+    totals = {ALL_CATEGORIES: [1, 0, order.total_amount]}
+    for category_id, quantity, subtotal in items:
+        totals[ALL_CATEGORIES][1] += quantity
+        if category_id is None:
+            continue
+        row = totals.setdefault(category_id, [1, 0, 0])
+        row[1] += quantity
+        row[2] += subtotal
+    day = order.created_at.date()
+    return [{
+        'day': day,
+        'status': status,
+        'category_id': category_id,
+        'order_count': sign * order_count,
+        'quantity': sign * quantity,
+        'revenue': sign * revenue,
+    } for category_id, (order_count, quantity, revenue) in totals.items()]
+
+
+def _upsert(rows):
+    """累加到汇总行，行不存在时插入"""
+    if not rows:
+        return
+    # 固定加锁顺序，避免并发事务互相死锁
+    rows.sort(key=lambda row: (row['day'], row['status'], row['category_id']))
+    table = SalesRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in COUNTERS})
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'status', 'category_id'],
+            set_={c: table.c[c] + stmt.excluded[c] for c in COUNTERS}
+        )
+    else:
+        for row in rows:
+            result = db.session.execute(
+                db.update(table)
+                .where(table.c.day == row['day'],
+                       table.c.status == row['status'],
+                       table.c.category_id == row['category_id'])
+                .values({c: table.c[c] + row[c] for c in COUNTERS})
+            )
+            if not result.rowcount:
+                db.session.execute(db.insert(table), row)
+        return
+    db.session.execute(stmt, rows)
+
+
+def _order_items(order):
+    """按分类汇总订单项：[(分类ID, 数量, 小计)]"""
+    return db.session.query(Product.category_id,
+                            db.func.sum(OrderItem.quantity),
+                            db.func.sum(OrderItem.subtotal))\
+        .select_from(OrderItem)\
+        .outerjoin(Product, Product.id == OrderItem.product_id)\
+        .filter(OrderItem.order_id == order.id)\
+        .group_by(Product.category_id)\
+        .all()
+
+
+def record_order(order, items):
+    """新订单计入汇总（下单时在同一事务中调用）
+
+    :param items: [(分类ID, 数量, 小计)]
+    """
+    _upsert(_rollup_rows(order, order.status or 'pending', items, 1))
+
+
+def change_order_status(order, status):
+    """修改订单状态，并把订单从原状态的汇总移到新状态"""
+    if order.status == status:
+        return
+    items = _order_items(order)
+    _upsert(_rollup_rows(order, order.status, items, -1) + _rollup_rows(order, status, items, 1))
+    order.status = status
+
+
+def remove_order(order):
+    """删除订单前从汇总中扣除"""
+    _upsert(_rollup_rows(order, order.status, _order_items(order), -1))
+
+
+def rebuild_rollups():
+    """从订单表重建全部汇总，返回汇总行数"""
+    day = db.func.date(Order.created_at)
+    columns = ['day', 'status', 'category_id', 'order_count', 'quantity', 'revenue']
+
+    # 合计行：订单数、件数、订单总额
+    order_quantity = db.select(OrderItem.order_id, db.func.sum(OrderItem.quantity).label('quantity'))\
+        .group_by(OrderItem.order_id)\
+        .subquery()
+    overall = db.select(day, Order.status, db.literal(ALL_CATEGORIES),
+                        db.func.count(Order.id),
+                        db.func.coalesce(db.func.sum(order_quantity.c.quantity), 0),
+                        db.func.coalesce(db.func.sum(Order.total_amount), 0))\
+        .outerjoin(order_quantity, order_quantity.c.order_id == Order.id)\
+        .group_by(day, Order.status)
+
+    # 分类行：包含该分类商品的订单数、件数、小计之和
+    per_category = db.select(day, Order.status, Product.category_id,
+                             db.func.count(db.distinct(Order.id)),
+                             db.func.sum(OrderItem.quantity),
+                             db.func.sum(OrderItem.subtotal))\
+        .select_from(OrderItem)\
+        .join(Order, Order.id == OrderItem.order_id)\
+        .join(Product, Product.id == OrderItem.product_id)\
+        .where(Product.category_id.isnot(None))\
+        .group_by(day, Order.status, Product.category_id)
+
+    db.session.execute(db.delete(SalesRollup))
+    db.session.execute(db.insert(SalesRollup).from_select(columns, overall))
+    db.session.execute(db.insert(SalesRollup).from_select(columns, per_category))
+    db.session.commit()
+    return SalesRollup.query.count()
+
+
+def status_summary():
+    """各状态的订单数和销售额：{状态: (订单数, 销售额)}"""
+    rows = db.session.query(SalesRollup.status,
+                            db.func.sum(SalesRollup.order_count),
+                            db.func.sum(SalesRollup.revenue))\
+        .filter(SalesRollup.category_id == ALL_CATEGORIES)\
+        .group_by(SalesRollup.status)\
+        .all()
+    return {status: (int(order_count or 0), revenue or 0) for status, order_count, revenue in rows}
+
+
+def daily_trend(start, end):
+    """日期范围内每天的有效订单数和销售额（没有订单的日期补 0）"""
+    rows = db.session.query(SalesRollup.day,
+                            db.func.sum(SalesRollup.order_count),
+                            db.func.sum(SalesRollup.revenue))\
+        .filter(SalesRollup.category_id == ALL_CATEGORIES,
+                SalesRollup.status.in_(REVENUE_STATUSES),
+                SalesRollup.day.between(start, end))\
+        .group_by(SalesRollup.day)\
+        .all()
+    by_day = {day: (int(order_count or 0), float(revenue or 0)) for day, order_count, revenue in rows}
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return [(day, *by_day.get(day, (0, 0.0))) for day in days]
+
+
+def category_breakdown(start, end):
+    """日期范围内各分类的有效订单数、件数和销售额，按销售额降序"""
+    return db.session.query(SalesRollup.category_id,
+                            db.func.sum(SalesRollup.order_count),
+                            db.func.sum(SalesRollup.quantity),
+                            db.func.sum(SalesRollup.revenue).label('revenue'))\
+        .filter(SalesRollup.category_id != ALL_CATEGORIES,
+                SalesRollup.status.in_(REVENUE_STATUSES),
+                SalesRollup.day.between(start, end))\
+        .group_by(SalesRollup.category_id)\
+        .order_by(db.desc('revenue'))\
+        .all()
+
+
+def parse_date_range(start, end, default_days=30, max_days=366):
+    """解析 YYYY-MM-DD 格式的日期范围，非法或缺省时取最近 default_days 天"""
+    def parse(value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    end_date = parse(end) or datetime.utcnow().date()
+    start_date = parse(start) or end_date - timedelta(days=default_days - 1)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    if (end_date - start_date).days >= max_days:
+        start_date = end_date - timedelta(days=max_days - 1)
+    return start_date, end_date
@@ -0,0 +1,499 @@
+"""商品全文搜索
+
+根据数据库类型选择搜索后端：
+- SQLite: FTS5 虚拟表（products_fts），bm25 相关度排序
+- MySQL: FULLTEXT 索引 + ngram 分词器，MATCH ... AGAINST 相关度排序
+- 其他: 纯 Python 倒排索引
+
+SQLite 与 Python 后端共用同一个分词器：英文/数字按词切分，中文切分为相邻二字（bigram）。
+"""
+import bisect
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Product
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(f'[{_CJK}]+|[0-9a-z]+')
+_CJK_RE = re.compile(f'[{_CJK}]')
+
+# 商品名称的权重高于描述
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def _runs(value):
+    return _TOKEN_RE.findall((value or '').lower())
+
+
+def _is_cjk(run):
+    return bool(_CJK_RE.match(run))
+
+
+def index_tokens(value):
+    """建索引用的分词：中文同时保留单字和二字，支持单字查询"""
+    tokens = []
+    for run in _runs(value):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_tokens(value):
+    """查询用的分词：中文只取二字（单字查询取单字），结果去重并保持顺序"""
+    tokens = []
+    for run in _runs(value):
+        if _is_cjk(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return list(dict.fromkeys(tokens))
+
+
+class SearchBackend:
+    """搜索后端接口"""
+
+    name = None
+
+    def setup(self):
+        """创建索引结构（应用启动时调用，可重复执行）"""
+
+    def index_product(self, connection, product):
+        """商品新增或修改后更新索引（随当前事务提交或回滚）"""
+
+    def remove_product(self, connection, product_id):
+        """商品删除后移除索引"""
+
+    def apply_changes(self, changes):
+        """事务提交后应用 session.info['search_index_changes'] 中记录的修改"""
+
+    def rebuild(self):
+        """根据 products 表重建全部索引，返回索引的商品数"""
+        return 0
+
+    def search(self, keyword, category_id=None, offset=0, limit=12):
+        """返回按相关度排序的商品ID列表"""
+        raise NotImplementedError
+
+    def count(self, keyword, category_id=None):
+        """返回匹配的商品总数"""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 后端，products_fts 的 rowid 即商品ID"""
+
+    name = 'sqlite'
+
+    def setup(self):
+        db.session.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS products_fts '
+            'USING fts5(name, description, tokenize="unicode61")'
+        ))
+        db.session.commit()
+        indexed = db.session.execute(text('SELECT COUNT(*) FROM products_fts')).scalar()
+        if not indexed and db.session.query(Product.id).first():
+            self.rebuild()
+
+    @staticmethod
+    def _row(product_id, name, description):
+        return {
+            'id': product_id,
+            'name': ' '.join(index_tokens(name)),
+            'description': ' '.join(index_tokens(description)),
+        }
+
+    def index_product(self, connection, product):
+        self.remove_product(connection, product.id)
+        connection.execute(
+            text('INSERT INTO products_fts (rowid, name, description) VALUES (:id, :name, :description)'),
+            self._row(product.id, product.name, product.description)
+        )
+
+    def remove_product(self, connection, product_id):
+        connection.execute(text('DELETE FROM products_fts WHERE rowid = :id'), {'id': product_id})
+
+    def rebuild(self):
+        db.session.execute(text('DELETE FROM products_fts'))
+        rows = db.session.query(Product.id, Product.name, Product.description).yield_per(1000)
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(self._row(*row))
+            if len(batch) >= 1000:
+                total += self._insert(batch)
+                batch = []
+        if batch:
+            total += self._insert(batch)
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def _insert(batch):
+        db.session.execute(
+            text('INSERT INTO products_fts (rowid, name, description) VALUES (:id, :name, :description)'),
+            batch
+        )
+        return len(batch)
+
+    @staticmethod
+    def _match(keyword):
+        terms = []
+        for token in query_tokens(keyword):
+            # 英文/数字按前缀匹配，如 "iph" 可匹配 "iphone"
+            terms.append(f'"{token}"' if _is_cjk(token) else f'"{token}"*')
+        return ' '.join(terms)
+
+    def _query(self, select, keyword, category_id, suffix=''):
+        sql = (f'SELECT {select} FROM products_fts '
+               'JOIN products ON products.id = products_fts.rowid '
+               'WHERE products_fts MATCH :match')
+        params = {'match': self._match(keyword)}
+        if category_id:
+            sql += ' AND products.category_id = :category_id'
+            params['category_id'] = category_id
+        return text(sql + suffix), params
+
+    def search(self, keyword, category_id=None, offset=0, limit=12):
+        if not query_tokens(keyword):
+            return []
+        sql, params = self._query(
+            'products.id', keyword, category_id,
+            f' ORDER BY bm25(products_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), products.id DESC'
+            ' LIMIT :limit OFFSET :offset'
+        )
+        params.update(limit=limit, offset=offset)
+        return [row[0] for row in db.session.execute(sql, params)]
+
+    def count(self, keyword, category_id=None):
+        if not query_tokens(keyword):
+            return 0
+        sql, params = self._query('COUNT(*)', keyword, category_id)
+        return db.session.execute(sql, params).scalar()
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """MySQL FULLTEXT + ngram 后端，索引由 InnoDB 随数据自动维护"""
+
+    name = 'mysql'
+
+    INDEXES = {
+        'ft_products_name': 'name',
+        'ft_products_name_description': 'name, description',
+    }
+
+    def setup(self):
+        existing = {row[0] for row in db.session.execute(text(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'products'"
+        ))}
+        for index_name, columns in self.INDEXES.items():
+            if index_name in existing:
+                continue
+            try:
+                db.session.execute(text(
+                    f'ALTER TABLE products ADD FULLTEXT INDEX {index_name} ({columns}) WITH PARSER ngram'
+                ))
+                db.session.commit()
+            except SQLAlchemyError:
+                # 其他 worker 可能已经同时创建了索引
+                db.session.rollback()
+
+    def rebuild(self):
+        db.session.execute(text('OPTIMIZE TABLE products'))
+        db.session.commit()
+        return db.session.query(Product.id).count()
+
+    @staticmethod
+    def _boolean_query(keyword):
+        terms = []
+        for term in keyword.split():
+            term = term.replace('"', ' ').strip()
+            if term:
+                terms.append(f'+"{term}"')
+        return ' '.join(terms)
+
+    def _query(self, select, keyword, category_id, suffix=''):
+        sql = (f'SELECT {select} FROM products '
+               'WHERE MATCH(name, description) AGAINST(:boolean IN BOOLEAN MODE)')
+        params = {'boolean': self._boolean_query(keyword), 'natural': keyword}
+        if category_id:
+            sql += ' AND category_id = :category_id'
+            params['category_id'] = category_id
+        return text(sql + suffix), params
+
+    def search(self, keyword, category_id=None, offset=0, limit=12):
+        if not self._boolean_query(keyword):
+            return []
+        sql, params = self._query(
+            'id', keyword, category_id,
+            f' ORDER BY {NAME_WEIGHT} * MATCH(name) AGAINST(:natural IN NATURAL LANGUAGE MODE)'
+            f' + {DESCRIPTION_WEIGHT} * MATCH(name, description) AGAINST(:natural IN NATURAL LANGUAGE MODE) DESC,'
+            ' id DESC LIMIT :limit OFFSET :offset'
+        )
+        params.update(limit=limit, offset=offset)
+        return [row[0] for row in db.session.execute(sql, params)]
+
+    def count(self, keyword, category_id=None):
+        if not self._boolean_query(keyword):
+            return 0
+        sql, params = self._query('COUNT(*)', keyword, category_id)
+        return db.session.execute(sql, params).scalar()
+
+
+class PythonIndexBackend(SearchBackend):
+    """纯 Python 倒排索引（进程内）
+
+    索引在首次搜索时从数据库构建，本进程内的商品增删改在事务提交后更新，回滚的修改不会进入索引；
+    其他进程的修改通过定期比对 (商品数, 最大更新时间) 发现并重建。
+    """
+
+    name = 'python'
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._documents = {}                # product_id -> (category_id, tokens)
+        self._vocabulary = None             # 排序后的词表，用于英文前缀匹配
+        self._signature = None
+        self._checked_at = 0
+        self._built = False
+
+    @staticmethod
+    def _weights(name, description):
+        weights = defaultdict(float)
+        for token in index_tokens(name):
+            weights[token] += NAME_WEIGHT
+        for token in index_tokens(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        return weights
+
+    @staticmethod
+    def _current_signature():
+        return db.session.query(db.func.count(Product.id), db.func.max(Product.updated_at)).one()
+
+    def _add(self, product_id, name, description, category_id):
+        self._remove(product_id)
+        weights = self._weights(name, description)
+        for token, weight in weights.items():
+            self._postings[token][product_id] = weight
+        self._documents[product_id] = (category_id, tuple(weights))
+        self._vocabulary = None
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document:
+            for token in document[1]:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(product_id, None)
+                    if not postings:
+                        del self._postings[token]
+            self._vocabulary = None
+
+    def rebuild(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._vocabulary = None
+            rows = db.session.query(
+                Product.id, Product.name, Product.description, Product.category_id
+            ).yield_per(1000)
+            for row in rows:
+                self._add(*row)
+            self._signature = tuple(self._current_signature())
+            self._checked_at = time.monotonic()
+            self._built = True
+            return len(self._documents)
+
+    def _ensure_fresh(self):
+        if not self._built:
+            self.rebuild()
+            return
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = time.monotonic()
+        if tuple(self._current_signature()) != self._signature:
+            self.rebuild()
+
+    def index_product(self, connection, product):
+        # 索引不在数据库中，无法随事务回滚：按会话记录修改（值在此时取出），提交后应用、回滚时丢弃
+        changes = db.session.info.setdefault('search_index_changes', {})
+        changes[product.id] = (product.name, product.description, product.category_id)
+
+    def remove_product(self, connection, product_id):
+        db.session.info.setdefault('search_index_changes', {})[product_id] = None
+
+    def apply_changes(self, changes):
+        """{商品ID: (名称, 描述, 分类ID)，已删除的为 None}"""
+        if self._built:
+            with self._lock:
+                for product_id, document in changes.items():
+                    if document is None:
+                        self._remove(product_id)
+                    else:
+                        self._add(product_id, *document)
+
+    def _matches(self, token):
+        """英文/数字按前缀匹配词表，中文精确匹配"""
+        if _is_cjk(token):
+            return [self._postings[token]] if token in self._postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, token)
+        matches = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            matches.append(self._postings[term])
+        return matches
+
+    def _ranked(self, keyword, category_id):
+        tokens = query_tokens(keyword)
+        if not tokens:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            total = len(self._documents) or 1
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for postings in self._matches(token):
+                    idf = math.log(1 + total / len(postings))
+                    for product_id, weight in postings.items():
+                        token_scores[product_id] += weight * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # 所有查询词都必须命中
+                    scores = {pid: score + token_scores[pid] for pid, score in scores.items()
+                              if pid in token_scores}
+                if not scores:
+                    return []
+            if category_id:
+                scores = {pid: score for pid, score in scores.items()
+                          if self._documents[pid][0] == category_id}
+        return sorted(scores, key=lambda pid: (-scores[pid], -pid))
+
+    def search(self, keyword, category_id=None, offset=0, limit=12):
+        return self._ranked(keyword, category_id)[offset:offset + limit]
+
+    def count(self, keyword, category_id=None):
+        return len(self._ranked(keyword, category_id))
+
+
+class SearchPagination(Pagination):
+    """按相关度排序的搜索结果分页，接口与 Flask-SQLAlchemy 的分页对象一致"""
+
+    def _query_items(self):
+        args = self._query_args
+        ids = args['backend'].search(args['keyword'], args['category_id'],
+                                     offset=self._query_offset, limit=self.per_page)
+        if not ids:
+            return []
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+        return [products[pid] for pid in ids if pid in products]
+
+    def _query_count(self):
+        args = self._query_args
+        return args['backend'].count(args['keyword'], args['category_id'])
+
+
+def get_search_backend():
+    return current_app.extensions['product_search']
+
+
+def search_products(keyword, category_id=None, page=1, per_page=12):
+    """搜索商品，返回分页对象"""
+    return SearchPagination(page=page, per_page=per_page, error_out=False,
+                            backend=get_search_backend(), keyword=keyword,
+                            category_id=category_id)
+
+
+def _create_backend(app):
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = db.engine.dialect.name
+    if name == 'sqlite':
+        return SQLiteFTSBackend()
+    if name == 'mysql':
+        return MySQLFulltextBackend()
+    return PythonIndexBackend(refresh_interval=app.config.get('SEARCH_INDEX_REFRESH', 30))
+
+
+def init_search(app):
+    """初始化搜索后端；数据表尚未创建时（如执行迁移前）只记录警告"""
+    with app.app_context():
+        backend = _create_backend(app)
+        try:
+            backend.setup()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            if isinstance(backend, SQLiteFTSBackend) and 'fts5' in str(e):
+                # 当前 SQLite 未编译 FTS5 扩展，退回纯 Python 索引
+                backend = PythonIndexBackend(refresh_interval=app.config.get('SEARCH_INDEX_REFRESH', 30))
+            else:
+                app.logger.warning(f'搜索索引初始化失败: {e}')
+        app.extensions['product_search'] = backend
+
+
+def _backend():
+    try:
+        return current_app.extensions.get('product_search')
+    except RuntimeError:
+        # 没有应用上下文
+        return None
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    backend = _backend()
+    if backend:
+        backend.index_product(connection, target)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    backend = _backend()
+    if not backend:
+        return
+    state = db.inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in ('name', 'description', 'category_id')):
+        backend.index_product(connection, target)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    backend = _backend()
+    if backend:
+        backend.remove_product(connection, target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    changes = session.info.pop('search_index_changes', None)
+    backend = _backend()
+    if changes and backend:
+        backend.apply_changes(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('search_index_changes', None)
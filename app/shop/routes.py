@@ -1,9 +1,10 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import current_user, login_required
 from app import db
-from app.models import Product, UserLog, Review, Order
+from app.models import Product, Review, Order
 from app.forms import ReviewForm
 from app.shop import shop
+from app.user_log import log_action
 from datetime import datetime
 
 @shop.route('/review/<int:product_id>', methods=['GET', 'POST'])
@@ -55,16 +56,10 @@ def add_review(product_id):
                 db.session.add(review)
                 action = 'add'
             
-            # 记录日志
-            log = UserLog(
-                user_id=current_user.id,
-                action=f'{action}_review',
-                details=f'{action}评价: {product.name}，评分: {form.rating.data}',
-                ip_address=request.remote_addr
-            )
-            db.session.add(log)
-            
             db.session.commit()
+            
+            # 记录日志（异步批量写入）
+            log_action(f'{action}_review', f'{action}评价: {product.name}，评分: {form.rating.data}')
             flash('评价提交成功', 'success')
             
         except Exception as e:
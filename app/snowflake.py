@@ -0,0 +1,138 @@
+"""订单号生成（Snowflake 风格）
+
+64 位整数 ID 的组成（从高位到低位）：
+    41 位  毫秒时间戳（自 2024-01-01 起，约可用 69 年）
+     5 位  节点号，多台服务器部署时通过 ORDER_NUMBER_NODE_ID 为每台机器配置不同的值
+     5 位  进程槽位，同一台机器上的进程通过文件锁各自占用一个槽位（最多 32 个进程）
+    12 位  同一毫秒内的序号（每个进程每毫秒最多 4096 个）
+
+生成过程只在进程内加锁，不访问数据库；同一进程生成的 ID 严格递增。
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # 非 Unix 平台没有文件锁，按 PID 取槽位
+    fcntl = None
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+NODE_BITS = 5
+SLOT_BITS = 5
+SEQUENCE_BITS = 12
+
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SLOT = (1 << SLOT_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+# 时钟回拨不超过该值（毫秒）时等待时钟追上，否则报错
+MAX_CLOCK_BACKWARD_MS = 1000
+
+
+class SnowflakeGenerator:
+    def __init__(self, node_id=0, slot_dir=None):
+        self.node_id = node_id
+        self.slot_dir = slot_dir
+        self._lock = threading.Lock()
+        self._pid = None
+        self._slot = None
+        self._slot_file = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def init_app(self, app):
+        self.node_id = int(app.config.get('ORDER_NUMBER_NODE_ID', 0))
+        if not 0 <= self.node_id <= MAX_NODE_ID:
+            raise ValueError(f'ORDER_NUMBER_NODE_ID 必须在 0-{MAX_NODE_ID} 之间')
+        self.slot_dir = app.config.get('ORDER_NUMBER_SLOT_DIR') \
+            or os.path.join(app.instance_path, 'order_number_slots')
+        app.extensions['order_number'] = self
+
+    def _claim_slot(self):
+        """为当前进程占用一个槽位，进程退出时文件锁自动释放"""
+        if fcntl is None or self.slot_dir is None:
+            return os.getpid() & MAX_SLOT, None
+        os.makedirs(self.slot_dir, exist_ok=True)
+        for slot in range(MAX_SLOT + 1):
+            f = open(os.path.join(self.slot_dir, f'{slot}.lock'), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            return slot, f
+        raise RuntimeError(f'订单号进程槽位已用完（同一台机器最多 {MAX_SLOT + 1} 个进程）')
+
+    def _ensure_slot(self):
+        if self._pid == os.getpid():
+            return
+        # fork 出的子进程继承了父进程的状态，需要占用自己的槽位并重置序号
+        self._slot, self._slot_file = self._claim_slot()
+        self._last_ms = -1
+        self._sequence = 0
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _now_ms():
+        return time.time_ns() // 1000000
+
+    def next_id(self):
+        with self._lock:
+            self._ensure_slot()
+            now = self._now_ms()
+            if now < self._last_ms:
+                if self._last_ms - now > MAX_CLOCK_BACKWARD_MS:
+                    raise RuntimeError(f'系统时钟回拨 {self._last_ms - now} 毫秒，拒绝生成订单号')
+                while now < self._last_ms:
+                    time.sleep((self._last_ms - now) / 1000)
+                    now = self._now_ms()
+
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    # 本毫秒的序号用完，等到下一毫秒
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+
+            return ((now - EPOCH_MS) << (NODE_BITS + SLOT_BITS + SEQUENCE_BITS)) \
+                | (self.node_id << (SLOT_BITS + SEQUENCE_BITS)) \
+                | (self._slot << SEQUENCE_BITS) \
+                | self._sequence
+
+
+order_number_generator = SnowflakeGenerator()
+
+
+def generate_order_number():
+    """生成订单号，例如 ORD2199023255552123456"""
+    return f'ORD{order_number_generator.next_id()}'
+
+
+def _stress_worker(args):
+    """压力测试子进程：用独立的生成器生成 count 个订单号"""
+    node_id, slot_dir, count = args
+    generator = SnowflakeGenerator(node_id=node_id, slot_dir=slot_dir)
+    return [generator.next_id() for _ in range(count)]
+
+
+def stress_test(processes=8, count=100000, node_id=0, slot_dir=None):
+    """多进程并发生成订单号，返回 (生成总数, 重复数, 耗时秒数)"""
+    import multiprocessing
+    import tempfile
+
+    slot_dir = slot_dir or tempfile.mkdtemp(prefix='order_number_slots_')
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        batches = pool.map(_stress_worker, [(node_id, slot_dir, count)] * processes)
+    elapsed = time.perf_counter() - start
+
+    ids = [i for batch in batches for i in batch]
+    for batch in batches:
+        if any(a >= b for a, b in zip(batch, batch[1:])):
+            raise AssertionError('同一进程生成的订单号不是严格递增的')
+    return len(ids), len(ids) - len(set(ids)), elapsed
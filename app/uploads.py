@@ -0,0 +1,27 @@
+"""按视图放宽上传大小限制
+
+MAX_CONTENT_LENGTH 对所有请求生效；个别需要接收大文件的视图（如商品批量导入）用
+max_upload_size 指定另一个配置项作为上限。上传的文件由 Werkzeug 写入临时文件，
+不会整体读入内存。
+"""
+from flask import Request, current_app
+
+
+def max_upload_size(config_key):
+    """视图装饰器：该视图的请求大小上限改由 config_key 配置（需紧贴路由装饰器）"""
+    def decorator(f):
+        f.max_upload_size_config = config_key
+        return f
+    return decorator
+
+
+class UploadRequest(Request):
+    @property
+    def max_content_length(self):
+        if not current_app:
+            return None
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        config_key = getattr(view, 'max_upload_size_config', None)
+        if config_key:
+            return current_app.config.get(config_key)
+        return current_app.config['MAX_CONTENT_LENGTH']
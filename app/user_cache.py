@@ -0,0 +1,156 @@
+"""登录用户的身份缓存
+
+Flask-Login 在每个已登录请求开始时调用 user_loader。这里缓存用户的精简投影
+（id、username、is_admin、is_active），命中时不查询数据库；视图或模板访问其他
+属性（如 email、address、orders）时才按需加载完整的 User。
+
+失效方式与分类缓存相同：提交了上述字段的修改或删除用户时，清空本进程缓存并替换
+版本文件（instance/user_cache.version），其他 worker 在下次请求时通过 stat 发现
+版本变化。TTL（USER_CACHE_TTL）作为兜底，保证禁用、降权最迟在 TTL 内生效。
+绕过 ORM 的批量 UPDATE 需手动调用 user_cache.invalidate()。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+
+CachedIdentity = namedtuple('CachedIdentity', 'id username is_admin is_active')
+
+# 修改这些字段时需要失效缓存
+CACHED_FIELDS = ('username', 'is_admin', 'is_active')
+
+
+class CachedUser(UserMixin):
+    """缓存中的登录用户，访问投影以外的属性时加载完整的 User"""
+
+    def __init__(self, identity):
+        self.id = identity.id
+        self.username = identity.username
+        self.is_admin = identity.is_admin
+        self._active = identity.is_active
+        self._user = None
+
+    @property
+    def is_active(self):
+        return bool(self._active)
+
+    def __getattr__(self, name):
+        # 只有实例上不存在的属性才会走到这里
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._user is None:
+            from app.models import User
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                raise AttributeError(name)
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    def __init__(self):
+        self.version_file = None
+        self.ttl = 60
+        self.max_entries = 10000
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stamp = None
+
+    def init_app(self, app):
+        os.makedirs(app.instance_path, exist_ok=True)
+        self.version_file = os.path.join(app.instance_path, 'user_cache.version')
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', 10000)
+        app.extensions['user_cache'] = self
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.version_file)
+        except (OSError, TypeError):
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load(self, user_id):
+        from app.models import User
+
+        row = db.session.query(User.id, User.username, User.is_admin, User.is_active)\
+            .filter(User.id == user_id).first()
+        return CachedIdentity(*row) if row else None
+
+    def get(self, user_id):
+        """返回用户的身份投影，用户不存在时返回 None"""
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                # 其他进程修改了用户
+                self._entries.clear()
+                self._stamp = stamp
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        identity = self._load(user_id)
+        if identity is not None:
+            with self._lock:
+                self._entries[user_id] = (identity, time.monotonic())
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self):
+        """清空本进程缓存并更新版本文件，通知其他进程"""
+        with self._lock:
+            self._entries.clear()
+        if not self.version_file:
+            return
+        tmp = f'{self.version_file}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(time.time_ns()))
+        # 原子替换，inode 变化即版本变化
+        os.replace(tmp, self.version_file)
+
+
+user_cache = UserCache()
+
+
+def load_cached_user(user_id):
+    """Flask-Login 的 user_loader：已禁用或已删除的用户视为未登录"""
+    identity = user_cache.get(int(user_id))
+    if identity is None or not identity.is_active:
+        return None
+    return CachedUser(identity)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    from app.models import User
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in CACHED_FIELDS):
+                session.info['users_changed'] = True
+                return
+    if any(isinstance(obj, User) for obj in session.deleted):
+        session.info['users_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('users_changed', False):
+        user_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('users_changed', None)
@@ -0,0 +1,181 @@
+"""用户日志的异步批量写入
+
+请求中只把日志放入内存队列，由后台线程按批次（数量或时间阈值）用一条
+多行 INSERT 写入 user_logs，避免每次页面访问都产生一个同步写事务。
+
+队列接近满时按比例采样，队满时丢弃，并分别计数；进程退出时写完剩余日志。
+每个进程（gunicorn worker）在首次写日志时启动自己的后台线程。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import request
+from flask_login import current_user
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UserLogWriter:
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.queue_size = 10000
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.sample_threshold = 0.8
+        self.sample_rate = 10
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._sample_counter = 0
+        self._stats = dict.fromkeys(('enqueued', 'written', 'batches', 'sampled_out', 'dropped', 'failed'), 0)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('USER_LOG_ASYNC', True)
+        self.queue_size = app.config.get('USER_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('USER_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('USER_LOG_FLUSH_INTERVAL', 1.0)
+        self.sample_threshold = app.config.get('USER_LOG_SAMPLE_THRESHOLD', 0.8)
+        self.sample_rate = app.config.get('USER_LOG_SAMPLE_RATE', 10)
+        app.extensions['user_log_writer'] = self
+        atexit.register(self.shutdown)
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # fork 后子进程需要自己的队列和线程
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name='user-log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def log(self, user_id, action, details=None, ip_address=None, user_agent=None):
+        row = {
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': datetime.utcnow(),
+        }
+        if not self.enabled:
+            self._write([row])
+            return
+
+        self._ensure_started()
+        if self._queue.qsize() >= self.queue_size * self.sample_threshold:
+            # 队列积压时只保留 1/sample_rate 的日志
+            with self._stats_lock:
+                self._sample_counter += 1
+                keep = self._sample_counter % self.sample_rate == 0
+            if not keep:
+                self._count('sampled_out')
+                return
+        try:
+            self._queue.put_nowait(row)
+            self._count('enqueued')
+        except queue.Full:
+            self._count('dropped')
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                self._write(batch)
+                return
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, rows):
+        if not rows:
+            return
+        from app.models import UserLog
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    # 一条多行 INSERT
+                    connection.execute(db.insert(UserLog).values(rows))
+            self._count('written', len(rows))
+            self._count('batches')
+        except Exception:
+            logger.exception('写入用户日志失败')
+            self._count('failed', len(rows))
+
+    def flush(self):
+        """在当前线程写入队列中的全部日志"""
+        if self._pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is _STOP:
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def shutdown(self, timeout=5):
+        """停止后台线程并写完剩余日志（进程退出时调用）"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(timeout)
+        except queue.Full:
+            pass
+        self.flush()
+        self._pid = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return stats
+
+
+user_log_writer = UserLogWriter()
+
+
+def log_action(action, details=None):
+    """记录当前登录用户的操作日志（异步写入）"""
+    user_log_writer.log(
+        user_id=current_user.id,
+        action=action,
+        details=details,
+        ip_address=request.remote_addr
+    )
@@ -0,0 +1,226 @@
+"""用户日志按月分桶、保留期与冷归档
+
+user_logs 是热表，新日志只写入这里（见 app.user_log）。rotate_logs 分两步维护：
+1. 把本月之前的日志按月份分批移入 user_logs_YYYYMM 月表（结构同热表，不带外键）；
+2. 超过保留期的月表按 ID 分批导出为 gzip 压缩的 JSONL 归档文件，导完后删除该表。
+每批在一个事务中完成，归档进度记录在归档文件旁的 .state 文件中，中断后重新执行即可继续，
+归档文件中不会出现重复或缺失的行。
+
+没有使用 MySQL 分区：分区表不支持外键，且主键必须包含分区列；月表在 SQLite 和 MySQL 下
+行为一致，过期数据整表删除，后台查询也可以按时间范围只访问相关的表。
+"""
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, text
+
+from app import db
+from app.fastjson import dumps
+from app.models import User, UserLog
+from app.pagination import keyset_paginate_buckets
+
+BUCKET_PATTERN = re.compile(r'^user_logs_(\d{4})(\d{2})$')
+
+_metadata = db.MetaData()  # 月表不参与 db.create_all
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def bucket_name(month):
+    return f'user_logs_{month:%Y%m}'
+
+
+def bucket_table(month):
+    """月份对应的月表（Table 对象，不一定已在数据库中创建）"""
+    name = bucket_name(month)
+    if name in _metadata.tables:
+        return _metadata.tables[name]
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key,
+                         nullable=column.nullable, autoincrement=False)
+               for column in UserLog.__table__.columns]
+    return db.Table(
+        name, _metadata, *columns,
+        db.Index(f'ix_{name}_created_at_id', 'created_at', 'id'),
+        db.Index(f'ix_{name}_user_created_at', 'user_id', 'created_at', 'id'),
+    )
+
+
+def list_buckets():
+    """数据库中已有的月表对应的月份，从新到旧"""
+    months = []
+    for name in db.inspect(db.engine).get_table_names():
+        match = BUCKET_PATTERN.match(name)
+        if match:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+
+# ---------- 查询 ----------
+
+def _log_query(table, user_id):
+    # 用户名在同一条查询中联接，列表页不再逐条加载 log.user
+    query = db.session.query(
+        table.c.id, table.c.user_id, table.c.action, table.c.details, table.c.ip_address,
+        table.c.user_agent, table.c.created_at, User.username
+    ).outerjoin(User, User.id == table.c.user_id)
+    if user_id:
+        query = query.filter(table.c.user_id == user_id)
+    return query
+
+
+def _buckets(user_id):
+    hot = UserLog.__table__
+    buckets = [(None, None, _log_query(hot, user_id), [(hot.c.created_at, True), (hot.c.id, True)])]
+    for month in list_buckets():
+        table = bucket_table(month)
+        buckets.append((month, add_months(month, 1), _log_query(table, user_id),
+                        [(table.c.created_at, True), (table.c.id, True)]))
+    return buckets
+
+
+def paginate_logs(user_id=None, cursor=None, per_page=50, total=None):
+    """按时间倒序游标分页查询日志（热表和月表），只访问与当前页相关的月表"""
+    return keyset_paginate_buckets(_buckets(user_id), cursor=cursor, per_page=per_page, total=total)
+
+
+def approximate_total():
+    """估算热表和各月表的日志总数（不含已归档的）
+
+    MySQL 读取 information_schema 的统计值；SQLite 用每张表的 ID 范围近似（走主键，常数时间）。
+    """
+    tables = [UserLog.__table__] + [bucket_table(month) for month in list_buckets()]
+    if db.session.get_bind().dialect.name == 'mysql':
+        return db.session.execute(text(
+            'SELECT SUM(TABLE_ROWS) FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name IN :tables'
+        ).bindparams(bindparam('tables', expanding=True)), {'tables': [t.name for t in tables]}).scalar() or 0
+    total = 0
+    for table in tables:
+        low, high = db.session.query(db.func.min(table.c.id), db.func.max(table.c.id)).one()
+        if high is not None:
+            total += high - low + 1
+    return total
+
+
+# ---------- 分桶与归档 ----------
+
+def rollover(before, batch_size=5000, progress=None):
+    """把热表中 before 之前的日志按月份移入月表，返回移动的行数"""
+    hot = UserLog.__table__
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            db.select(hot).where(hot.c.created_at < before)
+            .order_by(hot.c.created_at, hot.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return moved
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(month_start(row.created_at), []).append(row._asdict())
+        # 先建表（MySQL 的 DDL 会隐式提交），再在一个事务中插入月表并从热表删除
+        for month in by_month:
+            bucket_table(month).create(db.session.connection(), checkfirst=True)
+        for month, month_rows in by_month.items():
+            db.session.execute(db.insert(bucket_table(month)), month_rows)
+        db.session.execute(db.delete(hot).where(hot.c.id.in_([row.id for row in rows])))
+        db.session.commit()
+        moved += len(rows)
+        if progress:
+            progress('rollover', moved)
+
+
+def _read_state(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def archive_bucket(month, directory, batch_size=5000, progress=None):
+    """把一个月表导出为 directory 下的 user_logs_YYYYMM.jsonl.gz 并删除该表，返回归档的行数
+
+    每批追加一个 gzip 成员（多个成员拼接仍是合法的 gzip 文件，zcat 可直接读取），
+    写入并 fsync 后记录进度，再从月表删除这些行。
+    """
+    table = bucket_table(month)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{table.name}.jsonl.gz')
+    state_path = path + '.state'
+
+    state = _read_state(state_path)
+    if state is None:
+        if os.path.exists(path):
+            raise RuntimeError(f'归档文件已存在：{path}')
+        state = {'last_id': 0, 'size': 0, 'rows': 0}
+        _write_state(state_path, state)
+    with open(path, 'ab') as f:
+        # 丢弃上次中断时写了一半、尚未记录进度的数据
+        f.truncate(state['size'])
+    db.session.execute(db.delete(table).where(table.c.id <= state['last_id']))
+    db.session.commit()
+
+    while True:
+        rows = db.session.execute(
+            db.select(table).where(table.c.id > state['last_id']).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        data = gzip.compress(b''.join(dumps(row._asdict()) + b'\n' for row in rows), compresslevel=6)
+        with open(path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        state = {'last_id': rows[-1].id, 'size': size, 'rows': state['rows'] + len(rows)}
+        _write_state(state_path, state)
+        db.session.execute(db.delete(table).where(table.c.id <= state['last_id']))
+        db.session.commit()
+        if progress:
+            progress(table.name, state['rows'])
+
+    table.drop(db.session.connection())
+    db.session.commit()
+    os.remove(state_path)
+    return state['rows']
+
+
+def archive_dir():
+    return current_app.config.get('USER_LOG_ARCHIVE_DIR') or os.path.join(current_app.instance_path,
+                                                                         'user_log_archive')
+
+
+def rotate_logs(retention_months, batch_size=5000, now=None, progress=None):
+    """移动本月之前的日志到月表，并归档保留期（月）之前的月表
+
+    返回 (移入月表的行数, {归档的月表: 行数})。
+    """
+    current = month_start(now or datetime.utcnow())
+    moved = rollover(current, batch_size, progress)
+    cutoff = add_months(current, -retention_months)
+    archived = {}
+    for month in sorted(list_buckets()):
+        if month < cutoff:
+            archived[bucket_name(month)] = archive_bucket(month, archive_dir(), batch_size, progress)
+    return moved, archived
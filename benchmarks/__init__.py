@@ -0,0 +1,9 @@
+"""商城热点路径的基准测试
+
+- dataset:   生成固定种子的合成数据集（python -m benchmarks.dataset）
+- scenarios: 测试场景（首页各排序、搜索、商品 API、加入购物车、下单、订单列表、后台列表）
+- runner:    Flask 测试客户端或多进程 HTTP 负载生成器执行场景
+- report:    延迟分位数、吞吐量、每次请求查询数，与基线比较
+
+用法见 python -m benchmarks --help。
+"""
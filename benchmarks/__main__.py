@@ -0,0 +1,85 @@
+"""运行基准测试
+
+进程内（Flask 测试客户端，数据库由 DATABASE_URL 指定）：
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks --scale 1k --requests 200
+
+多进程 HTTP（服务需使用同一数据集启动，例如
+DATABASE_URL=sqlite:////tmp/bench.db gunicorn -w 4 run:app）：
+    python -m benchmarks --http http://127.0.0.1:8000 --processes 8 --duration 10
+
+保存基线并在之后与之比较（有退化时退出码为 1）：
+    python -m benchmarks --requests 200 --save-baseline benchmarks/baselines/client-1k.json
+    python -m benchmarks --requests 200 --baseline benchmarks/baselines/client-1k.json
+"""
+import argparse
+import logging
+import sys
+
+from benchmarks.dataset import SCALES, create_bench_app, scale_counts
+from benchmarks.report import (build_report, compare, format_comparison, format_table, load_report,
+                               mismatched_meta, save_report)
+from benchmarks.runner import run_client, run_http
+from benchmarks.scenarios import select_scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description='商城热点路径基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k', help='数据集规模（需与生成时一致）')
+    parser.add_argument('--products', type=int, help='商品数（生成数据集时单独指定过才需要）')
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help='只运行指定场景或场景前缀（如 index、admin），可重复')
+    parser.add_argument('--http', metavar='BASE_URL', help='通过 HTTP 请求该地址，不指定时使用进程内测试客户端')
+    parser.add_argument('--processes', type=int, default=4, help='HTTP 模式的并发进程数')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景（HTTP 模式为每个进程）的请求数')
+    parser.add_argument('--duration', type=float, help='HTTP 模式下每个场景的持续时间（秒），优先于 --requests')
+    parser.add_argument('--warmup', type=int, default=5, help='进程内模式每个场景的预热请求数')
+    parser.add_argument('--config', default='production', help='进程内模式的应用配置名')
+    parser.add_argument('--output', help='结果 JSON 的保存路径')
+    parser.add_argument('--baseline', help='与该基线结果比较')
+    parser.add_argument('--save-baseline', metavar='PATH', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='判定退化的相对变化幅度')
+    args = parser.parse_args()
+
+    try:
+        scenarios = select_scenarios(args.scenarios)
+    except ValueError as e:
+        parser.error(str(e))
+    counts = scale_counts(args.scale, products=args.products)
+    meta = {'mode': 'http' if args.http else 'client', 'scale': args.scale, 'counts': counts}
+
+    if args.http:
+        meta.update(base_url=args.http, processes=args.processes,
+                    requests=None if args.duration else args.requests, duration=args.duration)
+        results = run_http(args.http, scenarios, counts, args.processes,
+                           requests=None if args.duration else args.requests, duration=args.duration)
+    else:
+        app = create_bench_app(args.config)
+        app.config['WTF_CSRF_ENABLED'] = False
+        # 疑似 N+1 的警告每次请求都会输出，汇总结果中已有查询数
+        logging.getLogger('app.profiling').setLevel(logging.ERROR)
+        if not app.config.get('PROFILING_ENABLED'):
+            print('PROFILING_ENABLED 未开启，结果中没有每次请求的查询数', file=sys.stderr)
+        meta.update(requests=args.requests, database=app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1])
+        results = run_client(app, scenarios, counts, args.requests, warmup=args.warmup)
+
+    report = build_report(results, scenarios, meta)
+    print(format_table(report))
+    if args.output:
+        save_report(report, args.output)
+    if args.save_baseline:
+        save_report(report, args.save_baseline)
+        print(f'已保存基线 {args.save_baseline}')
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        rows, regressed = compare(report, baseline, args.tolerance)
+        print(f'\n与基线 {args.baseline} 比较（容差 {args.tolerance:.0%}）：')
+        mismatched = mismatched_meta(report, baseline)
+        if mismatched:
+            print(f'注意：{", ".join(mismatched)} 与基线不同，结果可能不可比')
+        print(format_comparison(rows))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""登录风暴下的商品页延迟测试
+
+先只请求商品页测量基线延迟，再在持续请求商品页的同时发起大量并发登录，
+比较两个阶段商品页的延迟分位数。用于评估密码哈希并发限制
+（PASSWORD_HASH_CONCURRENCY / PASSWORD_HASH_POOL_SIZE）的效果。
+
+用法（需先启动服务，例如 gunicorn -w 4 run:app）：
+    python benchmarks/login_storm.py --base-url http://127.0.0.1:8000 \\
+        --username testuser --password test123 --logins 32 --duration 20
+
+只依赖标准库。
+"""
+import argparse
+import http.cookiejar
+import itertools
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+
+    def add(self, latency, status):
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def summary(self, elapsed):
+        ms = [latency * 1000 for latency in self.latencies]
+        return (f'{len(ms)} 次，{len(ms) / elapsed:.1f} 次/秒，'
+                f'p50 {percentile(ms, 50):.1f}ms  p95 {percentile(ms, 95):.1f}ms  '
+                f'p99 {percentile(ms, 99):.1f}ms  状态码 {dict(sorted(self.statuses.items()))}')
+
+
+def timed_open(opener, url, data=None):
+    start = time.perf_counter()
+    try:
+        with opener.open(url, data=data, timeout=30) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    except OSError:
+        body = b''
+        status = 0
+    return time.perf_counter() - start, status, body
+
+
+def catalog_worker(base_url, path, stop, recorder, counter):
+    opener = urllib.request.build_opener()
+    while not stop.is_set():
+        # 加上不同的查询参数，避免命中匿名页面缓存
+        separator = '&' if '?' in path else '?'
+        url = f'{base_url}{path}{separator}_bench={next(counter)}'
+        latency, status, _ = timed_open(opener, url)
+        recorder.add(latency, status)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """登录成功返回 302，不跟随跳转"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+    def http_error_302(self, req, fp, code, msg, headers):
+        return fp
+
+
+def login_worker(base_url, username, password, stop, recorder):
+    while not stop.is_set():
+        # 每次登录使用新的会话
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            NoRedirect()
+        )
+        _, _, body = timed_open(opener, f'{base_url}/auth/login')
+        match = CSRF_PATTERN.search(body.decode('utf-8', 'replace'))
+        form = {'username': username, 'password': password}
+        if match:
+            form['csrf_token'] = match.group(1)
+        latency, status, _ = timed_open(opener, f'{base_url}/auth/login',
+                                        urllib.parse.urlencode(form).encode())
+        recorder.add(latency, status)
+
+
+def run_phase(args, logins):
+    stop = threading.Event()
+    catalog = Recorder()
+    login = Recorder()
+    counter = itertools.count()
+    threads = [threading.Thread(target=catalog_worker,
+                                args=(args.base_url, args.catalog_path, stop, catalog, counter))
+               for _ in range(args.catalog_clients)]
+    threads += [threading.Thread(target=login_worker,
+                                 args=(args.base_url, args.username, args.password, stop, login))
+                for _ in range(logins)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return catalog, login, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录风暴下的商品页延迟测试')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--catalog-path', default='/', help='测量延迟的商品页路径')
+    parser.add_argument('--catalog-clients', type=int, default=4, help='并发请求商品页的客户端数')
+    parser.add_argument('--username', default='testuser')
+    parser.add_argument('--password', default='test123')
+    parser.add_argument('--logins', type=int, default=32, help='并发登录的客户端数')
+    parser.add_argument('--duration', type=float, default=15, help='每个阶段的持续时间（秒）')
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+
+    print(f'基线：{args.catalog_clients} 个客户端请求 {args.catalog_path}，持续 {args.duration} 秒')
+    catalog, _, elapsed = run_phase(args, 0)
+    print(f'  商品页  {catalog.summary(elapsed)}')
+
+    print(f'登录风暴：另加 {args.logins} 个客户端持续登录')
+    catalog, login, elapsed = run_phase(args, args.logins)
+    print(f'  商品页  {catalog.summary(elapsed)}')
+    print(f'  登录    {login.summary(elapsed)}（302 为成功，503 为哈希并发已满被拒绝）')
+
+
+if __name__ == '__main__':
+    main()
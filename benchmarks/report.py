@@ -0,0 +1,139 @@
+"""基准测试结果统计与基线比较"""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def summarize(samples, endpoint):
+    ms = [latency * 1000 for latency in samples.latencies]
+    count = len(ms)
+    return {
+        'endpoint': endpoint,
+        'requests': count,
+        'errors': samples.errors,
+        'statuses': {str(status): n for status, n in sorted(samples.statuses.items())},
+        'throughput_rps': round(count / samples.elapsed, 2) if samples.elapsed else 0,
+        'latency_ms': {
+            'p50': round(percentile(ms, 50), 3),
+            'p95': round(percentile(ms, 95), 3),
+            'p99': round(percentile(ms, 99), 3),
+            'mean': round(sum(ms) / count, 3) if count else 0,
+            'max': round(max(ms), 3) if count else 0,
+        },
+        'queries_per_request': round(sum(samples.queries) / len(samples.queries), 2) if samples.queries else None,
+        'max_queries': max(samples.queries) if samples.queries else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def build_report(results, scenarios, meta):
+    endpoints = {scenario.name: scenario.endpoint for scenario in scenarios}
+    return {
+        'meta': dict(meta,
+                     created_at=datetime.now().isoformat(timespec='seconds'),
+                     git_revision=_git_revision(),
+                     python=platform.python_version(),
+                     host=platform.node()),
+        'scenarios': {name: summarize(samples, endpoints[name]) for name, samples in results.items()},
+    }
+
+
+def save_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=0.2):
+    """与基线比较，返回 (行列表, 是否有退化)
+
+    p95 延迟比基线高出 tolerance 以上、吞吐量低 tolerance 以上、每次请求平均多出半次以上查询
+    或出现新的错误都算退化。
+    """
+    rows = []
+    regressed = False
+    for name, current in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            rows.append({'scenario': name, 'status': 'new'})
+            continue
+        problems = []
+        p95, base_p95 = current['latency_ms']['p95'], base['latency_ms']['p95']
+        if base_p95 and p95 > base_p95 * (1 + tolerance):
+            problems.append('p95')
+        rps, base_rps = current['throughput_rps'], base['throughput_rps']
+        if base_rps and rps < base_rps * (1 - tolerance):
+            problems.append('throughput')
+        queries, base_queries = current['queries_per_request'], base['queries_per_request']
+        if queries is not None and base_queries is not None and queries > base_queries + 0.5:
+            problems.append('queries')
+        if current['errors'] > base['errors']:
+            problems.append('errors')
+        regressed = regressed or bool(problems)
+        rows.append({
+            'scenario': name,
+            'status': 'regressed' if problems else 'ok',
+            'problems': problems,
+            'p95_change': round(p95 / base_p95 - 1, 3) if base_p95 else None,
+            'throughput_change': round(rps / base_rps - 1, 3) if base_rps else None,
+            'queries': [base_queries, queries],
+        })
+    return rows, regressed
+
+
+def mismatched_meta(report, baseline):
+    """运行方式与基线不同的配置项，这些项不同时结果不可比"""
+    keys = ('mode', 'scale', 'counts', 'processes')
+    return [key for key in keys if report['meta'].get(key) != baseline.get('meta', {}).get(key)]
+
+
+def format_table(report):
+    # 中文表头每个字占两列，宽度按显示宽度对齐
+    lines = [f'{"场景":<16}{"请求":>5}{"错误":>6}{"吞吐/秒":>8}{"p50":>10}{"p95":>10}{"p99":>10}{"查询/请求":>8}']
+    for name, row in report['scenarios'].items():
+        latency = row['latency_ms']
+        queries = row['queries_per_request']
+        lines.append(f'{name:<18}{row["requests"]:>7}{row["errors"]:>8}{row["throughput_rps"]:>11.1f}'
+                     f'{latency["p50"]:>10.1f}{latency["p95"]:>10.1f}{latency["p99"]:>10.1f}'
+                     f'{"-" if queries is None else f"{queries:.1f}":>12}')
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = []
+    for row in rows:
+        if row['status'] == 'new':
+            lines.append(f'{row["scenario"]:<18}基线中没有该场景')
+            continue
+        p95 = f'{row["p95_change"]:+.1%}' if row['p95_change'] is not None else '-'
+        rps = f'{row["throughput_change"]:+.1%}' if row['throughput_change'] is not None else '-'
+        before, after = row['queries']
+        mark = '退化：' + ','.join(row['problems']) if row['problems'] else '正常'
+        lines.append(f'{row["scenario"]:<18}p95 {p95:>8}  吞吐 {rps:>8}  查询 {before} -> {after}  {mark}')
+    return '\n'.join(lines)
@@ -0,0 +1,201 @@
+"""执行基准测试场景
+
+两种驱动方式共用同一套场景和统计：
+- ClientSession：进程内使用 Flask 测试客户端，单线程顺序请求，排除网络和 WSGI 服务器的影响，
+  适合在开发机上比较代码改动前后的差异；
+- HttpSession：通过 HTTP 请求已启动的服务（如 gunicorn），由 run_http 启动多个进程并发请求，
+  测量包含服务器排队在内的延迟和吞吐量。
+
+每次请求的查询数取自响应的 Server-Timing 头（见 app/profiling.py），服务端需开启 PROFILING_ENABLED。
+"""
+import http.cookiejar
+import multiprocessing
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks.dataset import ADMIN_USERNAME, PASSWORD, username
+
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+CSRF_PATTERN = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def query_count(server_timing):
+    match = QUERIES_PATTERN.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+class Samples:
+    """一个场景的测量结果"""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+        self.statuses = {}
+        self.elapsed = 0.0
+
+    def add(self, latency, status, queries, ok):
+        self.latencies.append(latency)
+        if queries is not None:
+            self.queries.append(queries)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.queries += other.queries
+        self.errors += other.errors
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+class ClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, data=None):
+        """返回 (状态码, Location, Server-Timing)"""
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return (response.status_code, response.headers.get('Location'),
+                ', '.join(response.headers.getlist('Server-Timing')))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+    def http_error_302(self, req, fp, code, msg, headers):
+        return fp
+
+    http_error_301 = http_error_303 = http_error_307 = http_error_302
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect()
+        )
+        self.csrf_token = None
+
+    def _open(self, method, path, data):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def send(self, method, path, data=None):
+        if method == 'POST':
+            if self.csrf_token is None:
+                # 会话中的 CSRF 令牌对所有表单有效，只需取一次
+                _, _, page = self._open('GET', '/auth/login', None)
+                match = CSRF_PATTERN.search(page.decode('utf-8', 'replace'))
+                self.csrf_token = match.group(1) if match else ''
+            data = dict(data or {}, csrf_token=self.csrf_token)
+        status, headers, _ = self._open(method, path, data)
+        return status, headers.get('Location'), ', '.join(headers.get_all('Server-Timing') or [])
+
+
+def login(session, name, attempts=20):
+    """登录，密码哈希并发已满（503）时稍后重试"""
+    for _ in range(attempts):
+        status, _, _ = session.send('POST', '/auth/login', {'username': name, 'password': PASSWORD})
+        if status == 302:
+            return
+        if status != 503:
+            break
+        time.sleep(0.2)
+    raise RuntimeError(f'用户 {name} 登录失败（状态码 {status}），请确认已用 benchmarks.dataset 生成数据')
+
+
+def run_scenario(session, scenario, counts, requests=None, duration=None, seed=0, offset=0):
+    """按请求数或持续时间执行一个场景；offset 用于多进程时区分 _bench 参数"""
+    rng = random.Random(f'{scenario.name}-{seed}')
+    samples = Samples()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    n = 0
+    while (requests is None or n < requests) and (deadline is None or time.perf_counter() < deadline):
+        index = offset + n
+        if scenario.prepare:
+            for method, path, data in scenario.prepare(rng, counts, index):
+                session.send(method, path, data)
+        method, path, data = scenario.build(rng, counts, index)
+        start = time.perf_counter()
+        try:
+            status, location, timing = session.send(method, path, data)
+        except OSError:
+            status, location, timing = 0, None, None
+        latency = time.perf_counter() - start
+        samples.add(latency, status, query_count(timing), scenario.check(status, location))
+        n += 1
+    samples.elapsed = time.perf_counter() - started
+    for method, path, data in scenario.cleanup:
+        session.send(method, path, data)
+    return samples
+
+
+def _login_for(session, role, worker):
+    if role == 'admin':
+        login(session, ADMIN_USERNAME)
+    elif role == 'user':
+        # 每个进程使用不同的用户，购物车和订单互不干扰
+        login(session, username(worker + 1))
+
+
+def run_client(app, scenarios, counts, requests, warmup=5):
+    """进程内顺序执行各场景，返回 {场景名: Samples}"""
+    results = {}
+    sessions = {}
+    for scenario in scenarios:
+        session = sessions.get(scenario.role)
+        if session is None:
+            session = sessions[scenario.role] = ClientSession(app)
+            _login_for(session, scenario.role, 0)
+        if warmup:
+            run_scenario(session, scenario, counts, requests=warmup, seed='warmup', offset=10 ** 9)
+        results[scenario.name] = run_scenario(session, scenario, counts, requests=requests)
+    return results
+
+
+def _http_worker(args):
+    base_url, scenario_name, counts, requests, duration, worker, start_at = args
+    from benchmarks.scenarios import select_scenarios
+
+    scenario = select_scenarios([scenario_name])[0]
+    session = HttpSession(base_url)
+    _login_for(session, scenario.role, worker)
+    # 各进程登录完成后同时开始
+    time.sleep(max(0.0, start_at - time.time()))
+    return run_scenario(session, scenario, counts, requests=requests, duration=duration,
+                        seed=worker, offset=worker * 10 ** 7)
+
+
+def run_http(base_url, scenarios, counts, processes, requests=None, duration=None):
+    """每个场景由 processes 个进程并发请求，返回 {场景名: Samples}
+
+    requests 为每个进程的请求数；给出 duration 时按持续时间（秒）执行。
+    """
+    results = {}
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        for scenario in scenarios:
+            start_at = time.time() + 2 + 0.05 * processes
+            parts = pool.map(_http_worker, [(base_url, scenario.name, counts, requests, duration, worker, start_at)
+                                            for worker in range(processes)])
+            samples = Samples()
+            for part in parts:
+                samples.merge(part)
+            # 吞吐量按最慢进程的耗时计算
+            samples.elapsed = max(part.elapsed for part in parts)
+            results[scenario.name] = samples
+    return results
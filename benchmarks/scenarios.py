@@ -0,0 +1,90 @@
+"""基准测试场景
+
+每个场景描述一类请求：以什么身份访问（匿名、普通用户、管理员）、每次请求的方法和路径，
+以及不计入耗时的准备请求（如下单前先加入购物车）和收尾请求。
+
+匿名页面带上递增的 _bench 参数绕过页面缓存，测量的是实际渲染的开销。
+"""
+from benchmarks.dataset import SEARCH_KEYWORDS
+
+
+class Scenario:
+    def __init__(self, name, endpoint, build, role='anonymous', prepare=None, cleanup=None, check=None):
+        """
+        :param build: build(rng, counts, n) 返回 (方法, 路径, 表单数据)
+        :param role: anonymous / user / admin
+        :param prepare: 与 build 相同签名，返回每次请求前需要先发送的请求列表（不计时）
+        :param cleanup: 场景结束后发送的请求列表（不计时）
+        :param check: check(status, location) 判断请求是否成功，默认 2xx/3xx 为成功
+        """
+        self.name = name
+        self.endpoint = endpoint
+        self.build = build
+        self.role = role
+        self.prepare = prepare
+        self.cleanup = cleanup or []
+        self.check = check or (lambda status, location: 200 <= status < 400)
+
+
+def _random_product(rng, counts):
+    return rng.randint(1, counts['products'])
+
+
+def _add_to_cart(rng, counts, n):
+    return 'POST', f'/cart/add/{_random_product(rng, counts)}', {'quantity': 1}
+
+
+def _checkout_succeeded(status, location):
+    # 成功时跳转到订单详情，库存不足或购物车为空时跳回购物车
+    return status == 302 and '/order/' in (location or '')
+
+
+def build_scenarios():
+    from app.main.routes import PRODUCT_SORTS
+
+    scenarios = []
+    for sort in PRODUCT_SORTS:
+        scenarios.append(Scenario(
+            f'index_{sort}', 'main.index',
+            lambda rng, counts, n, sort=sort: ('GET', f'/?sort={sort}&_bench={n}', None)
+        ))
+    scenarios += [
+        Scenario('index_category', 'main.index',
+                 lambda rng, counts, n: ('GET', f'/?category_id={rng.randint(1, 8)}&_bench={n}', None)),
+        Scenario('search', 'main.search',
+                 lambda rng, counts, n: ('GET', f'/search?q={rng.choice(SEARCH_KEYWORDS)}&_bench={n}', None)),
+        Scenario('api_products', 'main.api_products',
+                 lambda rng, counts, n: ('GET', f'/api/products?category_id={rng.randint(1, 8)}&_bench={n}', None)),
+        Scenario('cart_add', 'cart.add_to_cart', _add_to_cart, role='user',
+                 cleanup=[('POST', '/cart/clear', {})]),
+        Scenario('checkout', 'order.checkout',
+                 lambda rng, counts, n: ('POST', '/order/checkout', {'shipping_address': '基准测试地址',
+                                                                    'payment_method': 'credit_card'}),
+                 role='user',
+                 prepare=lambda rng, counts, n: [_add_to_cart(rng, counts, n), ('GET', '/order/checkout', None)],
+                 check=_checkout_succeeded),
+        Scenario('order_list', 'order.order_list',
+                 lambda rng, counts, n: ('GET', '/order/list', None), role='user'),
+        Scenario('admin_products', 'admin.product_manage',
+                 lambda rng, counts, n: ('GET', '/admin/products', None), role='admin'),
+        Scenario('admin_orders', 'admin.order_manage',
+                 lambda rng, counts, n: ('GET', '/admin/orders', None), role='admin'),
+        Scenario('admin_users', 'admin.user_manage',
+                 lambda rng, counts, n: ('GET', '/admin/users', None), role='admin'),
+        Scenario('admin_logs', 'admin.user_logs',
+                 lambda rng, counts, n: ('GET', '/admin/logs', None), role='admin'),
+    ]
+    return scenarios
+
+
+def select_scenarios(names=None):
+    """按名称（或名称前缀，如 index、admin）选择场景"""
+    scenarios = build_scenarios()
+    if not names:
+        return scenarios
+    selected = [s for s in scenarios if any(s.name == name or s.name.startswith(name + '_') for name in names)]
+    unknown = [name for name in names
+               if not any(s.name == name or s.name.startswith(name + '_') for s in scenarios)]
+    if unknown:
+        raise ValueError(f'未知场景：{", ".join(unknown)}；可用场景：{", ".join(s.name for s in scenarios)}')
+    return selected
@@ -1,31 +1,120 @@
 ﻿import os
 
+def engine_options(uri):
+    """连接池配置；SQLite 使用 SQLAlchemy 默认值"""
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),          # 每个 worker 常驻的连接数
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),    # 高峰期可额外建立的连接数
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),    # 等待空闲连接的最长时间（秒）
+        # 连接最长使用时间（秒），应小于 MySQL 的 wait_timeout
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+        # 使用前检测连接是否可用，避免空闲后连接被服务端断开导致报错
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'True') == 'True',
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-here'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///ecommerce.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # 只读副本：逗号分隔的数据库地址，标记为只读的路由中的查询按轮询发往副本
+    SQLALCHEMY_BINDS = {
+        f'replica_{i}': url
+        for i, url in enumerate(u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip())
+    }
+    # 提交写操作后该用户的请求继续使用主库的时间（秒），避免读到副本上的旧数据
+    DB_PRIMARY_STICKY_SECONDS = int(os.environ.get('DB_PRIMARY_STICKY_SECONDS', 5))
+    
+    # 请求级 SQL 统计（Server-Timing 头和 /admin/perf），同一 SELECT 在一个请求中
+    # 执行达到阈值次数时记为疑似 N+1
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+    PROFILING_N_PLUS_ONE_THRESHOLD = int(os.environ.get('PROFILING_N_PLUS_ONE_THRESHOLD', 5))
     
     # 邮件配置
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True') == 'True'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@ecommerce.com')
+    # 邮件发送队列：每个进程的发送线程数、每个 SMTP 会话发送的最大邮件数
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS', 2))
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_SPOOL_DIR = os.environ.get('MAIL_SPOOL_DIR')  # 默认 instance/mail_spool
+    # 失败重试：第 n 次失败后等待 MAIL_RETRY_BASE * 2^(n-1) 秒，超过最大次数移入 failed/
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_BASE = int(os.environ.get('MAIL_RETRY_BASE', 30))
     
     # 分页配置
     PRODUCTS_PER_PAGE = 12
     ORDERS_PER_PAGE = 10
     
+    # 搜索配置：auto 按数据库类型选择（sqlite: FTS5，mysql: FULLTEXT ngram，其他: Python 倒排索引）
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    SEARCH_INDEX_REFRESH = int(os.environ.get('SEARCH_INDEX_REFRESH', 30))  # Python 索引检查更新的间隔（秒）
+    
+    # 分类缓存：版本文件失效之外的兜底过期时间（秒）
+    CATEGORY_CACHE_TTL = int(os.environ.get('CATEGORY_CACHE_TTL', 300))
+    
+    # 登录用户身份缓存的过期时间（秒），即禁用、降权在其他服务器上生效的最长延迟
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    
+    # 密码哈希：参数变化后用户下次登录时自动按新参数重新计算
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # 哈希进程池大小（0 表示在请求线程中直接计算）
+    PASSWORD_HASH_POOL_SIZE = int(os.environ.get('PASSWORD_HASH_POOL_SIZE', 0))
+    # 整台机器同时进行的哈希计算数；等待超过 PASSWORD_HASH_WAIT 秒则提示系统繁忙
+    # （同步 worker 等待期间无法处理其他请求，等待时间应尽量短）
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 2))
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 0.2))
+    
+    # 结算页库存锁定时长（分钟），过期锁定由 flask release-expired-holds 释放
+    INVENTORY_HOLD_MINUTES = int(os.environ.get('INVENTORY_HOLD_MINUTES', 15))
+    
+    # 订单号生成：多台服务器部署时每台配置不同的节点号（0-31）
+    ORDER_NUMBER_NODE_ID = int(os.environ.get('ORDER_NUMBER_NODE_ID', 0))
+    ORDER_NUMBER_SLOT_DIR = os.environ.get('ORDER_NUMBER_SLOT_DIR')  # 默认 instance/order_number_slots
+    
+    # 匿名页面缓存：memory（进程内LRU）、file（多 worker 共享目录）或 none
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')  # 默认 instance/page_cache
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 1000))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+    
+    # 用户日志异步批量写入
+    USER_LOG_ASYNC = os.environ.get('USER_LOG_ASYNC', 'True') == 'True'
+    USER_LOG_QUEUE_SIZE = int(os.environ.get('USER_LOG_QUEUE_SIZE', 10000))
+    USER_LOG_BATCH_SIZE = int(os.environ.get('USER_LOG_BATCH_SIZE', 200))
+    USER_LOG_FLUSH_INTERVAL = float(os.environ.get('USER_LOG_FLUSH_INTERVAL', 1.0))  # 秒
+    USER_LOG_SAMPLE_THRESHOLD = 0.8  # 队列占用超过该比例后开始采样
+    USER_LOG_SAMPLE_RATE = 10        # 采样时每 N 条保留 1 条
+    # 用户日志保留期：早于本月的日志移入月表，超过保留期（月）的月表归档后删除（flask rotate-user-logs）
+    USER_LOG_RETENTION_MONTHS = int(os.environ.get('USER_LOG_RETENTION_MONTHS', 12))
+    USER_LOG_ARCHIVE_DIR = os.environ.get('USER_LOG_ARCHIVE_DIR')  # 默认 instance/user_log_archive
+    
     # 上传配置
-    UPLOAD_FOLDER = 'app/static/uploads'
+    UPLOAD_FOLDER = 'app/static/uploads'  # 相对于项目根目录；商品图片的各规格文件在其下的 products 目录
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    
+    # 商品图片处理：进程池大小（0 为在请求进程中处理）、原图保存目录、单张图片的最大像素数
+    IMAGE_POOL_SIZE = int(os.environ.get('IMAGE_POOL_SIZE', 2))
+    IMAGE_ORIGINALS_DIR = os.environ.get('IMAGE_ORIGINALS_DIR')  # 默认 instance/product_images
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40000000))
+    
+    # 后台商品批量导入：上传文件大小上限（字节）和每个事务写入的行数
+    PRODUCT_IMPORT_MAX_SIZE = int(os.environ.get('PRODUCT_IMPORT_MAX_SIZE', 512 * 1024 * 1024))
+    PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 1000))
     
     @staticmethod
     def init_app(app):
-        # 确保上传文件夹存在
-        upload_folder = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+        # 确保上传文件夹存在（相对路径按项目根目录解析，app.root_path 是 app 包目录）
+        upload_folder = os.path.join(os.path.dirname(app.root_path), app.config['UPLOAD_FOLDER'])
+        app.config['UPLOAD_FOLDER'] = upload_folder
         if not os.path.exists(upload_folder):
             os.makedirs(upload_folder, exist_ok=True)
 
@@ -39,6 +128,10 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    # gunicorn 多 worker 共享页面缓存
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'file')
+    # 每个 worker 一个哈希子进程
+    PASSWORD_HASH_POOL_SIZE = int(os.environ.get('PASSWORD_HASH_POOL_SIZE', 1))
     
     @classmethod
     def init_app(cls, app):